@@ -0,0 +1,73 @@
+import time
+import logging
+import argparse
+import statistics
+import multiprocessing
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from models.resnet_model import MODELS, STAGES, create_model
+from device import setup_device
+
+# One training configuration on synthetic data; runs in its own process so the CPU peak RSS is its own
+def measure(arch, checkpoint_stages, batch_size, image_size, steps, device, amp):
+    device_config = setup_device(device, amp=amp)
+    model = device_config.prepare_model(create_model(arch, checkpoint_stages=checkpoint_stages))
+    model.train()
+    optimizer = optim.Adam(model.parameters(), lr=0.001)
+    criterion = nn.CrossEntropyLoss()
+    inputs = torch.randn(batch_size, 3, image_size, image_size)
+    labels = torch.randint(0, 1000, (batch_size,))
+    inputs, labels = device_config.to_device(inputs, labels)
+
+    device_config.reset_peak_memory()
+    step_times = []
+    for step in range(steps + 1):
+        start = time.perf_counter()
+        optimizer.zero_grad()
+        with device_config.autocast():
+            loss = criterion(model(inputs), labels)
+        loss.backward()
+        optimizer.step()
+        if device_config.device.type == 'cuda':
+            torch.cuda.synchronize(device_config.device)
+        if step:  # the first step allocates the optimizer state and warms up the kernels
+            step_times.append(time.perf_counter() - start)
+    return device_config.peak_memory(), statistics.median(step_times)
+
+def compare(arch='resnet50', configurations=((), STAGES), batch_size=32, image_size=224, steps=5,
+            device=None, amp=None):
+    """Peak memory and median step time of each checkpoint_stages configuration."""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for checkpoint_stages in configurations:
+        with context.Pool(1) as pool:
+            peak, step_time = pool.apply(measure, (arch, checkpoint_stages, batch_size, image_size, steps,
+                                                   device, amp))
+        results.append((checkpoint_stages, peak, step_time))
+        label = ','.join(checkpoint_stages) or 'none'
+        logging.info(f'checkpoint_stages={label}: peak memory {peak / 2**20:.0f} MiB, '
+                     f'step time {step_time * 1000:.0f} ms')
+
+    _, base_peak, base_time = results[0]
+    for checkpoint_stages, peak, step_time in results[1:]:
+        logging.info(f'{",".join(checkpoint_stages) or "none"} vs {",".join(results[0][0]) or "none"}: '
+                     f'{(base_peak - peak) / 2**20:.0f} MiB less peak memory, '
+                     f'{100 * (step_time / base_time - 1):+.0f}% step time')
+    return results
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Peak memory and step time with and without activation checkpointing.')
+    parser.add_argument('--arch', default='resnet50', choices=sorted(MODELS))
+    parser.add_argument('--stages', nargs='+', default=['', ','.join(STAGES)],
+                        help="Configurations to compare, each a comma-separated stage list ('' for none)")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--steps', type=int, default=5)
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--amp', default=None, choices=['off', 'bf16', 'fp16'])
+    args = parser.parse_args()
+    compare(args.arch, [tuple(s for s in stages.split(',') if s) for stages in args.stages],
+            batch_size=args.batch_size, image_size=args.image_size, steps=args.steps,
+            device=args.device, amp=args.amp)
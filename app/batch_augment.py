@@ -0,0 +1,106 @@
+import math
+import numpy as np
+import torch
+import torch.nn.functional as F
+from models.resnet_model import IMAGENET_MEAN, IMAGENET_STD
+
+def sample_crop_boxes(heights, widths, scale=(0.08, 1.0), ratio=(3 / 4, 4 / 3), attempts=10, generator=None):
+    """RandomResizedCrop.get_params for a whole batch; returns int64 (top, left, height, width) vectors.
+
+    Each image draws `attempts` candidate boxes at once and keeps the first
+    that fits, falling back to the same ratio-clamped centre crop, so the box
+    distribution is the same as drawing them one image at a time.
+    """
+    heights = torch.as_tensor(heights, dtype=torch.float64)
+    widths = torch.as_tensor(widths, dtype=torch.float64)
+    n = len(heights)
+    area = (heights * widths).unsqueeze(1)
+    target_area = area * torch.empty(n, attempts, dtype=torch.float64).uniform_(*scale, generator=generator)
+    log_ratio = torch.empty(n, attempts, dtype=torch.float64).uniform_(math.log(ratio[0]), math.log(ratio[1]),
+                                                                        generator=generator)
+    aspect_ratio = torch.exp(log_ratio)
+    w = torch.round(torch.sqrt(target_area * aspect_ratio))
+    h = torch.round(torch.sqrt(target_area / aspect_ratio))
+    valid = (w > 0) & (h > 0) & (w <= widths.unsqueeze(1)) & (h <= heights.unsqueeze(1))
+    # First valid attempt per image (argmax returns the first maximum)
+    first = valid.to(torch.int8).argmax(dim=1, keepdim=True)
+    found = valid.any(dim=1)
+    w = w.gather(1, first).squeeze(1)
+    h = h.gather(1, first).squeeze(1)
+
+    # Fallback: whole image, clamped to the ratio range, centred
+    in_ratio = widths / heights
+    fallback_w = torch.where(in_ratio < ratio[0], widths,
+                             torch.where(in_ratio > ratio[1], torch.round(heights * ratio[1]), widths))
+    fallback_h = torch.where(in_ratio < ratio[0], torch.round(widths / ratio[0]), heights)
+    w = torch.where(found, w, fallback_w)
+    h = torch.where(found, h, fallback_h)
+
+    u = torch.rand(2, n, dtype=torch.float64, generator=generator)
+    top = torch.where(found, torch.floor(u[0] * (heights - h + 1)), torch.div(heights - h, 2, rounding_mode='floor'))
+    left = torch.where(found, torch.floor(u[1] * (widths - w + 1)), torch.div(widths - w, 2, rounding_mode='floor'))
+    return top.long(), left.long(), h.long(), w.long()
+
+class BatchAugment:
+    """RandomResizedCrop + RandomHorizontalFlip + Normalize for a whole batch of uint8 images.
+
+    Crop boxes and flips are sampled as vectors for the batch. Each crop is a
+    view into its image, resized by torch's antialiased bilinear uint8 kernel
+    (the one `resized_crop` uses on tensors; the scale differs per image, so
+    this is the only per-image call), and flipping and normalization run on
+    the whole batch. Use `collate` as a DataLoader `collate_fn`, so the
+    dataset only decodes to uint8 tensors, or call the object on a batch in
+    the main process.
+    """
+
+    # crop=False: the images are already crops (e.g. from DraftRandomResizedCrop) and are only resized
+    def __init__(self, size=224, scale=(0.08, 1.0), ratio=(3 / 4, 4 / 3), flip_p=0.5, mean=IMAGENET_MEAN,
+                 std=IMAGENET_STD, normalize=True, channels_last=False, generator=None, crop=True):
+        self.size = size
+        self.crop = crop
+        self.scale = scale
+        self.ratio = ratio
+        self.flip_p = flip_p
+        # (x / 255 - mean) / std == (x - 255 mean) / (255 std)
+        self.mean = torch.tensor(mean).view(1, 3, 1, 1) * 255
+        self.std = torch.tensor(std).view(1, 3, 1, 1) * 255
+        self.normalize = normalize
+        self.channels_last = channels_last
+        self.generator = generator
+
+    def __call__(self, images):
+        """Augment a uint8 NCHW batch, or a sequence of CHW uint8 images of any sizes."""
+        n = len(images)
+        heights = [image.shape[-2] for image in images]
+        widths = [image.shape[-1] for image in images]
+        if self.crop:
+            top, left, h, w = (v.tolist() for v in sample_crop_boxes(heights, widths, self.scale, self.ratio,
+                                                                     generator=self.generator))
+        else:
+            top, left, h, w = [0] * n, [0] * n, heights, widths
+        # Crops are views; the uint8 resize kernel is fastest on HWC-strided (channels_last) images
+        out = torch.cat([
+            F.interpolate(image[:, top[i]:top[i] + h[i], left[i]:left[i] + w[i]].unsqueeze(0),
+                          size=(self.size, self.size), mode='bilinear', align_corners=False, antialias=True)
+            for i, image in enumerate(images)
+        ])
+
+        flip = (torch.rand(n, generator=self.generator) < self.flip_p).nonzero().squeeze(1)
+        if len(flip):
+            out[flip] = out[flip].flip(3)
+
+        if self.normalize:
+            out = out.to(torch.float32).sub_(self.mean).div_(self.std)
+        # Converting at the end is cheaper than normalizing an NHWC batch (per-channel broadcast over the last dim)
+        if self.channels_last:
+            out = out.contiguous(memory_format=torch.channels_last)
+        return out
+
+    def collate(self, batch):
+        """collate_fn for datasets returning (CHW uint8 tensor, label) samples, possibly of different sizes."""
+        images, labels = zip(*batch)
+        return self(images), torch.tensor(labels)
+
+# PIL image -> CHW uint8 tensor that keeps PIL's HWC layout (a channels_last-strided view, no transpose copy)
+def pil_to_uint8(image):
+    return torch.from_numpy(np.array(image.convert('RGB'), dtype=np.uint8)).permute(2, 0, 1)
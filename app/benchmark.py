@@ -0,0 +1,171 @@
+import os
+import csv
+import json
+import time
+import logging
+import argparse
+import platform
+import itertools
+import subprocess
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from models.resnet_model import MODELS, create_model
+from models.quantized_resnet import QuantizableResNet50
+from models.compile import COMPILE_MODES, compile_model
+from data_loading import available_cores
+from device import AMP_DTYPES, DeviceConfig
+from quantize import quantize_model
+
+MODES = ('inference', 'train')
+DTYPES = ('fp32', 'bf16', 'int8')
+MEMORY_FORMATS = ('channels_last', 'contiguous')
+PERCENTILES = (50, 95, 99)
+
+def skip_reason(mode, dtype, compile, device):
+    # Combinations the matrix leaves out instead of reporting as failures
+    if dtype == 'int8':
+        if mode == 'train':
+            return 'int8 is inference only'
+        if device.type != 'cpu':
+            return 'quantized kernels are CPU only'
+        if compile == 'inductor':
+            return 'eager-mode quantized models are not compiled with inductor'
+    return None
+
+def build_model(arch, mode, dtype, device_config, compile, batch_size, image_size):
+    if dtype == 'int8':
+        if arch != 'resnet50':
+            raise ValueError('int8 benchmarks are only available for resnet50')
+        # Random weights calibrated on random inputs: the kernels, not the accuracy, are being measured
+        model = QuantizableResNet50(num_classes=1000)
+        calibration = [(torch.randn(batch_size, 3, image_size, image_size)
+                        .contiguous(memory_format=device_config.memory_format), None) for _ in range(2)]
+        quantize_model(model, calibration)
+    else:
+        model = create_model(arch, num_classes=1000)
+        if mode == 'inference':
+            model.eval().fuse_for_inference()
+    return compile_model(device_config.prepare_model(model), compile)
+
+def benchmark_case(arch='resnet50', mode='inference', batch_size=32, num_threads=None, dtype='fp32',
+                   memory_format='channels_last', compile='off', warmup=5, iters=20, device='cpu', image_size=224):
+    """Time `iters` steps of one configuration on synthetic data after `warmup` untimed steps."""
+    device = torch.device(device)
+    if device.type == 'cpu':
+        torch.set_num_threads(num_threads or available_cores())
+    autocast_dtype = AMP_DTYPES['bf16'] if dtype == 'bf16' else None
+    device_config = DeviceConfig(device, channels_last=memory_format == 'channels_last', autocast_dtype=autocast_dtype)
+
+    torch.manual_seed(0)
+    start = time.perf_counter()
+    model = build_model(arch, mode, dtype, device_config, compile, batch_size, image_size)
+    setup_time = time.perf_counter() - start
+    inputs, labels = device_config.to_device(torch.randn(batch_size, 3, image_size, image_size),
+                                             torch.randint(0, 1000, (batch_size,)))
+
+    if mode == 'train':
+        model.train()
+        criterion = nn.CrossEntropyLoss()
+        optimizer = optim.Adam(model.parameters(), lr=0.001)
+
+        def step():
+            optimizer.zero_grad(set_to_none=True)
+            with device_config.autocast():
+                loss = criterion(model(inputs), labels)
+            loss.backward()
+            optimizer.step()
+    else:
+        def step():
+            with torch.no_grad(), device_config.autocast():
+                model(inputs)
+
+    def timed_step():
+        start = time.perf_counter()
+        step()
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        return time.perf_counter() - start
+
+    # Warmup covers compilation, allocator growth and oneDNN primitive creation
+    warmup_times = [timed_step() for _ in range(warmup)]
+    times = np.array([timed_step() for _ in range(iters)])
+    result = {
+        'arch': arch, 'mode': mode, 'batch_size': batch_size,
+        'threads': torch.get_num_threads() if device.type == 'cpu' else None,
+        'dtype': dtype, 'memory_format': memory_format, 'compile': compile, 'device': str(device),
+        'warmup_steps': warmup, 'iters': iters,
+        'setup_s': setup_time, 'warmup_s': sum(warmup_times),
+        'images_per_s': batch_size * iters / times.sum(),
+    }
+    for q, value in zip(PERCENTILES, np.percentile(times, PERCENTILES)):
+        result[f'p{q}_ms'] = 1000 * value
+    return result
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'torch': torch.__version__, 'python': platform.python_version(),
+            'machine': platform.machine(), 'cores': available_cores(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+def run_suite(arch='resnet50', modes=MODES, batch_sizes=(1, 32), threads=(None,), dtypes=('fp32',),
+              memory_formats=('channels_last',), compile_modes=('off',), warmup=5, iters=20, device=None,
+              image_size=224, output_json=None, output_csv=None):
+    """Run every combination of the given settings; results go to JSON and/or CSV, tagged with the commit."""
+    device = torch.device(device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+    env = environment()
+    results = []
+    for mode, dtype, compile, memory_format, num_threads, batch_size in itertools.product(
+            modes, dtypes, compile_modes, memory_formats, threads, batch_sizes):
+        config = dict(arch=arch, mode=mode, batch_size=batch_size, num_threads=num_threads, dtype=dtype,
+                      memory_format=memory_format, compile=compile)
+        reason = skip_reason(mode, dtype, compile, device)
+        if reason is not None:
+            logging.debug(f'Skipping {config}: {reason}')
+            continue
+        try:
+            result = benchmark_case(warmup=warmup, iters=iters, device=device, image_size=image_size, **config)
+        except Exception as error:
+            logging.warning(f'Benchmark {config} failed: {error}')
+            continue
+        logging.info(f'{mode} {dtype} {memory_format} compile={compile} threads={result["threads"]} '
+                     f'batch={batch_size}: {result["images_per_s"]:.1f} images/s, '
+                     f'p50 {result["p50_ms"]:.1f} ms, p99 {result["p99_ms"]:.1f} ms')
+        results.append(dict(result, **env))
+
+    if output_json:
+        with open(output_json, 'w') as f:
+            json.dump({'environment': env, 'results': results}, f, indent=2)
+        logging.info(f'Wrote {len(results)} results to {output_json}')
+    if output_csv and results:
+        with open(output_csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+        logging.info(f'Wrote {len(results)} results to {output_csv}')
+    return results
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Throughput and latency of ResNet on synthetic data.')
+    parser.add_argument('--arch', default='resnet50', choices=sorted(MODELS))
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=MODES,
+                        help='inference: forward only; train: forward + backward + Adam step')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 32])
+    parser.add_argument('--threads', nargs='+', type=int, default=[None], help='CPU intra-op threads (default: all cores)')
+    parser.add_argument('--dtypes', nargs='+', default=['fp32'], choices=DTYPES)
+    parser.add_argument('--memory-formats', nargs='+', default=['channels_last'], choices=MEMORY_FORMATS)
+    parser.add_argument('--compile', nargs='+', default=['off'], choices=COMPILE_MODES)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--iters', type=int, default=20)
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--output-json', default='benchmark.json')
+    parser.add_argument('--output-csv', default=None)
+    args = parser.parse_args()
+    run_suite(args.arch, args.modes, args.batch_sizes, args.threads, args.dtypes, args.memory_formats, args.compile,
+              args.warmup, args.iters, args.device, args.image_size, args.output_json, args.output_csv)
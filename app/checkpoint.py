@@ -0,0 +1,116 @@
+import os
+import re
+import glob
+import random
+import logging
+import threading
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+
+CHECKPOINT_PATTERN = re.compile(r'checkpoint-(\d+)\.pt$')
+
+# Detached CPU copies of every tensor in a (nested) state dict; the training loop may keep mutating the originals
+def snapshot_to_cpu(obj):
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {key: snapshot_to_cpu(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot_to_cpu(value) for value in obj)
+    return obj
+
+def rng_state():
+    state = {
+        'torch': torch.get_rng_state(),
+        'numpy': np.random.get_state(),
+        'python': random.getstate(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+def set_rng_state(state):
+    torch.set_rng_state(state['torch'])
+    np.random.set_state(state['numpy'])
+    random.setstate(state['python'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+class ResumableSampler(Sampler):
+    """Wraps a sampler so the first epoch after a resume skips the samples already trained on."""
+
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.skip = 0
+
+    def __iter__(self):
+        skip, self.skip = self.skip, 0
+        for i, index in enumerate(self.sampler):
+            if i >= skip:
+                yield index
+
+    def __len__(self):
+        return len(self.sampler) - self.skip
+
+def list_checkpoints(checkpoint_dir):
+    paths = [path for path in glob.glob(os.path.join(checkpoint_dir, 'checkpoint-*.pt'))
+             if CHECKPOINT_PATTERN.search(path)]
+    return sorted(paths, key=lambda path: int(CHECKPOINT_PATTERN.search(path).group(1)))
+
+def latest_checkpoint(checkpoint_dir):
+    paths = list_checkpoints(checkpoint_dir)
+    return paths[-1] if paths else None
+
+def load_checkpoint(path):
+    # Checkpoints hold optimizer state, RNG states and plain Python objects, not just tensors
+    return torch.load(path, map_location='cpu', weights_only=False)
+
+class AsyncCheckpointer:
+    """Writes checkpoints on a background thread from a CPU snapshot.
+
+    At most one write is in flight: a new `save` first waits for the previous
+    one. Files are written to a temporary name and renamed into place, so a
+    crash never leaves a truncated `checkpoint-<step>.pt`; only the newest
+    `keep_last` are kept.
+    """
+
+    def __init__(self, checkpoint_dir, keep_last=3):
+        if keep_last < 1:
+            # The newest checkpoint is the one a resume needs, so it is always kept
+            raise ValueError(f'keep_last must be at least 1, got {keep_last}')
+        self.checkpoint_dir = checkpoint_dir
+        self.keep_last = keep_last
+        self._thread = None
+        self._error = None
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def save(self, state, step):
+        # The copy happens on the training thread; only serialization and disk I/O are deferred
+        snapshot = snapshot_to_cpu(state)
+        self.wait()
+        path = os.path.join(self.checkpoint_dir, f'checkpoint-{step:08d}.pt')
+        self._thread = threading.Thread(target=self._write, args=(snapshot, path), daemon=True)
+        self._thread.start()
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('Background checkpoint write failed') from error
+
+    def _write(self, snapshot, path):
+        try:
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                torch.save(snapshot, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            for old_path in list_checkpoints(self.checkpoint_dir)[:-self.keep_last]:
+                os.remove(old_path)
+            logging.info(f'Saved checkpoint {path}')
+        except Exception as error:
+            self._error = error
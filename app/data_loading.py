@@ -0,0 +1,123 @@
+import os
+import time
+import random
+import logging
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+# Number of cores this process may actually run on (respects taskset / cgroup affinity)
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# Leave one core for the main process, which runs the model step; `processes` training processes share the cores
+def default_num_workers(max_workers=16, processes=1):
+    return max(0, min(available_cores() // processes - 1, max_workers))
+
+# Give every worker its own numpy / random stream derived from the loader's torch seed
+def seed_worker(worker_id):
+    worker_seed = torch.initial_seed() % 2**32
+    np.random.seed(worker_seed)
+    random.seed(worker_seed)
+
+def channels_last_collate(batch):
+    """Like default_collate, but writes the CHW samples into one NHWC (channels_last) buffer.
+
+    The model then consumes the batch without any layout conversion. Inside a
+    worker the buffer is allocated in shared memory, as default_collate does,
+    so it reaches the main process without another copy.
+    """
+    images, labels = zip(*batch)
+    channels, height, width = images[0].shape
+    out = torch.empty((len(images), height, width, channels), dtype=images[0].dtype)
+    if torch.utils.data.get_worker_info() is not None:
+        out.share_memory_()
+    for i, image in enumerate(images):
+        out[i].copy_(image.permute(1, 2, 0))
+    return out.permute(0, 3, 1, 2), torch.tensor(labels)
+
+def make_loader(dataset, batch_size=32, shuffle=False, num_workers=None, prefetch_factor=2,
+                persistent_workers=True, pin_memory=None, seed=None, channels_last=False, **kwargs):
+    if num_workers is None:
+        num_workers = default_num_workers()
+    if pin_memory is None:
+        # Pinned host memory only pays off for copies to an accelerator
+        pin_memory = torch.cuda.is_available()
+
+    generator = None
+    if seed is not None:
+        generator = torch.Generator()
+        generator.manual_seed(seed)
+
+    loader_kwargs = dict(
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=num_workers,
+        pin_memory=pin_memory,
+        worker_init_fn=seed_worker,
+        generator=generator,
+    )
+    if channels_last:
+        loader_kwargs['collate_fn'] = channels_last_collate
+    # These options are rejected by DataLoader when loading happens in the main process
+    if num_workers > 0:
+        loader_kwargs['prefetch_factor'] = prefetch_factor
+        loader_kwargs['persistent_workers'] = persistent_workers
+    loader_kwargs.update(kwargs)
+    return DataLoader(dataset, **loader_kwargs)
+
+class ThroughputMeter:
+    """Splits wall time between waiting on the loader and everything done with a batch.
+
+    Compute time is only accurate when the step synchronises with the device
+    (e.g. via `.item()`); otherwise queued kernels are attributed to the next wait.
+    The first `warmup_steps` steps tracked (e.g. compilation) are timed
+    separately and left out of the steady-state numbers.
+    """
+
+    def __init__(self, warmup_steps=0):
+        self.warmup_steps = warmup_steps
+        self.warmup_time = 0.0
+        self.warmup_done = 0
+        self.reset()
+
+    def reset(self):
+        self.wait_time = 0.0
+        self.compute_time = 0.0
+        self.images = 0
+        self.steps = 0
+
+    def track(self, loader):
+        iterator = iter(loader)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            fetched = time.perf_counter()
+            if self.warmup_done < self.warmup_steps:
+                yield batch
+                self.warmup_time += time.perf_counter() - start
+                self.warmup_done += 1
+                continue
+            self.wait_time += fetched - start
+            yield batch
+            self.compute_time += time.perf_counter() - fetched
+            self.images += len(batch[-1])
+            self.steps += 1
+
+    def report(self, desc='Throughput'):
+        if self.warmup_time:
+            logging.info(f'{desc}: warmup/compilation {self.warmup_time:.1f}s over the first {self.warmup_done} steps')
+            self.warmup_time = 0.0
+        total = self.wait_time + self.compute_time
+        if self.steps == 0 or total == 0:
+            return
+        bottleneck = 'data loading' if self.wait_time > self.compute_time else 'compute'
+        logging.info(f'{desc}: {self.images / total:.1f} images/s over {self.steps} steps, '
+                     f'data wait {self.wait_time:.1f}s ({100 * self.wait_time / total:.0f}%), '
+                     f'compute {self.compute_time:.1f}s ({100 * self.compute_time / total:.0f}%), '
+                     f'bottleneck: {bottleneck}')
@@ -0,0 +1,114 @@
+import logging
+import resource
+import contextlib
+import torch
+from data_loading import available_cores
+
+# The CPU has native bf16 dot products (AVX512-BF16 or AMX); without them bf16 autocast is slower than fp32
+def cpu_supports_bf16():
+    if not torch.backends.mkldnn.is_available():
+        return False
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = set()
+            for line in f:
+                if line.startswith('flags'):
+                    flags.update(line.split(':', 1)[1].split())
+                    break
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+AMP_DTYPES = {'off': None, 'bf16': torch.bfloat16, 'fp16': torch.float16}
+
+class DeviceConfig:
+    """Where and how the model runs: device, memory format and autocast dtype."""
+
+    def __init__(self, device, channels_last=False, autocast_dtype=None, num_threads=None, interop_threads=None):
+        self.device = torch.device(device)
+        self.channels_last = channels_last
+        self.autocast_dtype = autocast_dtype
+        self.num_threads = num_threads
+        self.interop_threads = interop_threads
+
+    @property
+    def memory_format(self):
+        return torch.channels_last if self.channels_last else torch.contiguous_format
+
+    def prepare_model(self, model):
+        return model.to(self.device, memory_format=self.memory_format)
+
+    def to_device(self, inputs, labels):
+        non_blocking = self.device.type == 'cuda'
+        inputs = inputs.to(self.device, memory_format=self.memory_format, non_blocking=non_blocking)
+        return inputs, labels.to(self.device, non_blocking=non_blocking)
+
+    @property
+    def amp(self):
+        return next(mode for mode, dtype in AMP_DTYPES.items() if dtype == self.autocast_dtype)
+
+    def autocast(self):
+        if self.autocast_dtype is None:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=self.autocast_dtype)
+
+    # fp16 gradients underflow without loss scaling; bf16 has fp32's exponent range and needs none
+    def grad_scaler(self):
+        return torch.amp.GradScaler(self.device.type, enabled=self.autocast_dtype == torch.float16)
+
+    def reset_peak_memory(self):
+        if self.device.type == 'cuda':
+            torch.cuda.reset_peak_memory_stats(self.device)
+
+    # Peak bytes allocated on the device; on CPU the process's peak RSS, which cannot be reset
+    def peak_memory(self):
+        if self.device.type == 'cuda':
+            return torch.cuda.max_memory_allocated(self.device)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def describe(self):
+        parts = [f'device={self.device}', f'channels_last={self.channels_last}',
+                 f'amp={self.amp}']
+        if self.device.type == 'cpu':
+            parts.append(f'threads={torch.get_num_threads()}')
+            parts.append(f'interop_threads={torch.get_num_interop_threads()}')
+        return ', '.join(parts)
+
+def setup_device(device=None, num_threads=None, interop_threads=None, channels_last=None, amp=None):
+    """Pick a device and configure its fast path.
+
+    `amp` is one of 'off', 'bf16' or 'fp16'. `None` arguments are auto-tuned:
+    CUDA when available, all usable cores as intra-op threads, channels_last
+    on CPU (oneDNN prefers NHWC), and bf16 autocast only on CPUs with native
+    bf16 instructions; accelerators stay fp32 unless `amp` is given.
+    """
+    if amp is not None and amp not in AMP_DTYPES:
+        raise ValueError(f'Unknown AMP mode {amp!r}; expected one of {list(AMP_DTYPES)}')
+    if device is None:
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    device = torch.device(device)
+
+    if device.type == 'cpu':
+        if num_threads is None:
+            num_threads = available_cores()
+        torch.set_num_threads(num_threads)
+        if interop_threads is not None:
+            try:
+                torch.set_num_interop_threads(interop_threads)
+            except RuntimeError:
+                # Can only be set once, before any inter-op parallel work has started
+                logging.warning('Inter-op threads already initialised; keeping %d', torch.get_num_interop_threads())
+        if channels_last is None:
+            channels_last = True
+        if amp is None:
+            amp = 'bf16' if cpu_supports_bf16() else 'off'
+    else:
+        if channels_last is None:
+            channels_last = False
+        if amp is None:
+            amp = 'off'
+
+    config = DeviceConfig(device, channels_last=channels_last, autocast_dtype=AMP_DTYPES[amp],
+                          num_threads=num_threads, interop_threads=interop_threads)
+    logging.info(f'Device configuration: {config.describe()}')
+    return config
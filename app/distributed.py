@@ -0,0 +1,64 @@
+import os
+import logging
+import torch
+import torch.distributed as dist
+
+class DistributedContext:
+    """Rank information for the current process; a single-process run is rank 0 of 1."""
+
+    def __init__(self, rank=0, world_size=1, local_rank=0, local_world_size=1):
+        self.rank = rank
+        self.world_size = world_size
+        self.local_rank = local_rank
+        self.local_world_size = local_world_size
+
+    @property
+    def enabled(self):
+        return self.world_size > 1
+
+    @property
+    def is_main(self):
+        return self.rank == 0
+
+    def barrier(self):
+        if self.enabled:
+            dist.barrier()
+
+    def gather(self, obj):
+        """Every rank's `obj` as a list indexed by rank on rank 0, None on the others."""
+        if not self.enabled:
+            return [obj]
+        gathered = [None] * self.world_size if self.is_main else None
+        dist.gather_object(obj, gathered, dst=0)
+        return gathered
+
+def init_distributed(backend=None):
+    """Join the process group described by torchrun's environment variables, if any.
+
+    The backend defaults to nccl with CUDA and gloo otherwise, so several CPU
+    processes on one box work with `torchrun --nproc_per_node=N train.py`.
+    """
+    world_size = int(os.environ.get('WORLD_SIZE', 1))
+    if world_size <= 1:
+        return DistributedContext()
+
+    if backend is None:
+        backend = 'nccl' if torch.cuda.is_available() else 'gloo'
+    if not dist.is_initialized():
+        dist.init_process_group(backend=backend)
+    context = DistributedContext(rank=dist.get_rank(), world_size=dist.get_world_size(),
+                                 local_rank=int(os.environ.get('LOCAL_RANK', 0)),
+                                 local_world_size=int(os.environ.get('LOCAL_WORLD_SIZE', 1)))
+
+    # Only rank 0 logs progress; the other ranks still report warnings and errors, tagged with their rank
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers:
+        handler.setFormatter(logging.Formatter(f'%(asctime)s - rank {context.rank} - %(levelname)s - %(message)s'))
+    if not context.is_main:
+        root_logger.setLevel(logging.WARNING)
+    logging.info(f'Initialised {backend} process group with {context.world_size} ranks')
+    return context
+
+def cleanup_distributed(context):
+    if context.enabled and dist.is_initialized():
+        dist.destroy_process_group()
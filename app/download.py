@@ -0,0 +1,290 @@
+import io
+import os
+import json
+import time
+import zlib
+import shutil
+import hashlib
+import logging
+import argparse
+import zipfile
+import http.client
+import urllib.error
+import urllib.request
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+MARKER_FILE = '.download-complete.json'
+CHUNK_SIZE = 1 << 20
+
+# IncompleteRead is how a connection dropped mid-body surfaces
+NETWORK_ERRORS = (urllib.error.URLError, http.client.IncompleteRead, ConnectionError, TimeoutError)
+
+# 4xx answers will not change on retry
+def _retryable(error):
+    return not (isinstance(error, urllib.error.HTTPError) and error.code < 500)
+
+def _request(url, start=None, end=None, retries=3):
+    """urlopen with an optional byte range, retrying transient network errors with backoff.
+
+    Callers that read the body inside their own retry loop pass retries=0, so
+    there is only one retry layer.
+    """
+    headers = {}
+    if start is not None:
+        headers['Range'] = f'bytes={start}-' if end is None else f'bytes={start}-{end}'
+    for attempt in range(retries + 1):
+        try:
+            return urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=60)
+        except NETWORK_ERRORS as error:
+            if not _retryable(error) or attempt == retries:
+                raise
+            logging.warning(f'Request for {url} failed ({error}), retrying')
+            time.sleep(2 ** attempt)
+
+def probe(url):
+    """Resolve redirects and return (final url, size or None, whether byte ranges are served)."""
+    if urlparse(url).scheme == 'file':
+        path = urllib.request.url2pathname(urlparse(url).path)
+        return url, os.path.getsize(path), True
+    with _request(url, 0, 0) as response:
+        if response.status == 206:
+            return response.geturl(), int(response.headers['Content-Range'].rsplit('/', 1)[1]), True
+        length = response.headers.get('Content-Length')
+        return response.geturl(), int(length) if length is not None else None, False
+
+class RangeReader(io.RawIOBase):
+    """Read-only, seekable view of a remote file; every read is an HTTP Range request."""
+
+    def __init__(self, url, size, retries=3):
+        self.url = url
+        self.size = size
+        self.retries = retries
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(offset, 0)
+        return self.position
+
+    def readinto(self, buffer):
+        if self.position >= self.size or len(buffer) == 0:
+            return 0
+        end = min(self.position + len(buffer), self.size) - 1
+        for attempt in range(self.retries + 1):
+            try:
+                with _request(self.url, self.position, end, retries=0) as response:
+                    data = response.read()
+                break
+            except NETWORK_ERRORS as error:
+                if not _retryable(error) or attempt == self.retries:
+                    raise
+                logging.warning(f'Range read of {self.url} failed ({error}), retrying')
+                time.sleep(2 ** attempt)
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+def open_archive(url, size):
+    # Buffered so zipfile's small header reads share one request
+    if urlparse(url).scheme == 'file':
+        return open(urllib.request.url2pathname(urlparse(url).path), 'rb')
+    return io.BufferedReader(RangeReader(url, size), buffer_size=CHUNK_SIZE)
+
+def download_file(url, path, expected_sha256=None, retries=3):
+    """Download `url` to `path` through `path + '.part'`, resuming a partial file with an HTTP Range request.
+
+    The SHA-256 is computed while downloading (including the resumed prefix)
+    and checked against `expected_sha256` before the file is moved into place.
+    """
+    part_path = path + '.part'
+    digest = hashlib.sha256()
+    offset = 0
+    if os.path.exists(part_path):
+        with open(part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                offset += len(chunk)
+        logging.info(f'Resuming download of {url} at {offset} bytes')
+
+    for attempt in range(retries + 1):
+        try:
+            with _request(url, offset or None, retries=0) as response:
+                if offset and response.status != 206:
+                    # The server ignored the Range header; start over
+                    logging.warning(f'{url} does not support resuming; downloading from the start')
+                    digest, offset = hashlib.sha256(), 0
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        offset += len(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+                # read(n) ends quietly on a dropped connection; what is left of Content-Length tells it apart
+                remaining = getattr(response, 'length', None)
+                if remaining:
+                    raise http.client.IncompleteRead(b'', remaining)
+            break
+        except NETWORK_ERRORS as error:
+            if not _retryable(error) or attempt == retries:
+                raise
+            logging.warning(f'Download of {url} interrupted at {offset} bytes ({error}), resuming')
+            time.sleep(2 ** attempt)
+
+    sha256 = digest.hexdigest()
+    if expected_sha256 is not None and sha256 != expected_sha256.lower():
+        os.remove(part_path)
+        raise IOError(f'Checksum mismatch for {url}: expected {expected_sha256}, got {sha256}')
+    os.replace(part_path, path)
+    return sha256
+
+def _extract_members(open_fileobj, names, out_dir):
+    # Each worker has its own archive handle, so members are read in parallel
+    manifest = {}
+    with open_fileobj() as fileobj, zipfile.ZipFile(fileobj) as archive:
+        for name in names:
+            info = archive.getinfo(name)
+            target = os.path.join(out_dir, name)
+            manifest[name] = [info.file_size, info.CRC]
+            # Files only appear under their final name once complete, so existing ones are from an earlier run
+            if os.path.exists(target) and os.path.getsize(target) == info.file_size:
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # zipfile checks each member's CRC-32 as it is read
+            with archive.open(info) as source, open(target + '.tmp', 'wb') as f:
+                shutil.copyfileobj(source, f, CHUNK_SIZE)
+            os.replace(target + '.tmp', target)
+    return manifest
+
+def extract_zip(open_fileobj, out_dir, num_workers=8):
+    """Extract every file of a zip archive in parallel; returns {name: [size, crc32]}."""
+    with open_fileobj() as fileobj, zipfile.ZipFile(fileobj) as archive:
+        infos = [info for info in archive.infolist() if not info.is_dir()]
+    out_root = os.path.realpath(out_dir)
+    for info in infos:
+        if not os.path.realpath(os.path.join(out_dir, info.filename)).startswith(out_root + os.sep):
+            raise IOError(f'Refusing to extract {info.filename} outside {out_dir}')
+
+    # Workers take contiguous runs of the archive, so remote reads stay sequential
+    infos.sort(key=lambda info: info.header_offset)
+    num_workers = max(1, min(num_workers, len(infos)))
+    per_worker = (len(infos) + num_workers - 1) // num_workers
+    slices = [[info.filename for info in infos[i:i + per_worker]] for i in range(0, len(infos), per_worker)]
+    manifest = {}
+    with ThreadPoolExecutor(num_workers) as pool:
+        for part in pool.map(lambda names: _extract_members(open_fileobj, names, out_dir), slices):
+            manifest.update(part)
+    return manifest
+
+def read_marker(data_dir):
+    try:
+        with open(os.path.join(data_dir, MARKER_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def manifest_sha256(manifest):
+    # Checksum over the sorted (name, size, crc32) listing of the extracted files
+    digest = hashlib.sha256()
+    for name in sorted(manifest):
+        size, crc = manifest[name]
+        digest.update(f'{name}\t{size}\t{crc:08x}\n'.encode())
+    return digest.hexdigest()
+
+def verify_extracted(data_dir, check_crc=False):
+    """Check that every file listed in the completion marker is present with its size (and optionally CRC-32)."""
+    marker = read_marker(data_dir)
+    if marker is None:
+        return False
+    for name, (size, crc) in marker['files'].items():
+        path = os.path.join(data_dir, name)
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            return False
+        if check_crc:
+            value = 0
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    value = zlib.crc32(chunk, value)
+            if value != crc:
+                return False
+    return True
+
+def fetch_dataset(url, data_dir, expected_sha256=None, num_workers=8, keep_archive=False):
+    """Download and extract a zip dataset into `data_dir`, resuming whatever an earlier run left behind.
+
+    When the source serves byte ranges (or is a file:// URL) and no archive
+    checksum is requested, members are extracted straight from the remote
+    archive and the zip never touches the disk. Otherwise the archive is
+    downloaded resumably, verified against `expected_sha256`, extracted in
+    parallel and deleted. A completion marker with the archive and
+    per-file checksums is written last; only it marks the dataset as present.
+    """
+    marker = read_marker(data_dir)
+    if marker is not None and marker.get('url') == url:
+        logging.info(f'{data_dir} is complete ({len(marker["files"])} files). Skipping download.')
+        return marker
+    os.makedirs(data_dir, exist_ok=True)
+
+    resolved_url, size, ranges = probe(url)
+    archive_sha256 = None
+    if ranges and expected_sha256 is None:
+        logging.info(f'Extracting {url} ({size or 0} bytes) while streaming it, {num_workers} workers')
+        manifest = extract_zip(lambda: open_archive(resolved_url, size), data_dir, num_workers)
+    else:
+        zip_path = os.path.join(data_dir, 'archive.zip')
+        if not os.path.exists(zip_path):
+            logging.info(f'Downloading {url}...')
+            archive_sha256 = download_file(resolved_url, zip_path, expected_sha256)
+        else:
+            digest = hashlib.sha256()
+            with open(zip_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            archive_sha256 = digest.hexdigest()
+            if expected_sha256 is not None and archive_sha256 != expected_sha256.lower():
+                os.remove(zip_path)
+                raise IOError(f'Checksum mismatch for {zip_path}; removed it, run again to re-download')
+        logging.info(f'Extracting {zip_path} with {num_workers} workers')
+        manifest = extract_zip(lambda: open(zip_path, 'rb'), data_dir, num_workers)
+        if not keep_archive:
+            os.remove(zip_path)
+
+    marker = {'url': url, 'archive_size': size, 'archive_sha256': archive_sha256,
+              'files_sha256': manifest_sha256(manifest), 'files': manifest}
+    tmp_path = os.path.join(data_dir, MARKER_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(marker, f)
+    os.replace(tmp_path, os.path.join(data_dir, MARKER_FILE))
+    logging.info(f'Extracted {len(manifest)} files to {data_dir}')
+    return marker
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Resumable, checksummed download and extraction of a zip dataset.')
+    parser.add_argument('data_dir')
+    parser.add_argument('url', nargs='?', help='http(s):// or file:// URL of the zip archive')
+    parser.add_argument('--sha256', default=None, help='Expected archive SHA-256 (downloads the archive whole)')
+    parser.add_argument('--num-workers', type=int, default=8)
+    parser.add_argument('--keep-archive', action='store_true')
+    parser.add_argument('--verify', action='store_true', help='Only check the extracted files against the marker')
+    args = parser.parse_args()
+    if args.verify:
+        ok = verify_extracted(args.data_dir, check_crc=True)
+        logging.info(f'{args.data_dir}: {"complete" if ok else "incomplete or corrupt"}')
+        raise SystemExit(0 if ok else 1)
+    if args.url is None:
+        parser.error('a URL is required unless --verify is given')
+    fetch_dataset(args.url, args.data_dir, args.sha256, args.num_workers, args.keep_archive)
@@ -0,0 +1,179 @@
+import os
+import hashlib
+import logging
+import torch
+import torchvision.transforms as transforms
+from models.resnet_model import create_model
+from models.compile import compile_model
+from shard_dataset import ShardDataset, shard_eval_transform
+from jpeg_draft import draft_loader
+from file_index import IndexedImageFolder
+from data_loading import make_loader, ThroughputMeter
+from metrics import MetricAccumulator
+from profiling import PhaseTimer
+from device import setup_device
+
+# Replace with your dataset path
+VAL_DIR = '/opt/dlami/nvme/path/to/imagenet/imagenet-mini/val'
+
+class EvalMetrics:
+    """Result of one pass over the val set; every accuracy figure is derived from it."""
+
+    def __init__(self, confusion, top5_correct, classes=None):
+        self.confusion = confusion  # [true class, predicted class] counts
+        self.top5_correct = top5_correct
+        self.classes = classes
+
+    @property
+    def total(self):
+        return int(self.confusion.sum())
+
+    @property
+    def top1(self):
+        return 100 * int(self.confusion.diagonal().sum()) / self.total
+
+    @property
+    def top5(self):
+        return 100 * self.top5_correct / self.total
+
+    @property
+    def per_class_accuracy(self):
+        # NaN for classes with no val images
+        class_totals = self.confusion.sum(dim=1).double()
+        return 100 * self.confusion.diagonal().double() / class_totals
+
+    def __repr__(self):
+        return f'EvalMetrics(total={self.total}, top1={self.top1:.2f}%, top5={self.top5:.2f}%)'
+
+# PIL image -> CHW uint8 tensor, as the model saw the val set (the model normalizes uint8 input itself)
+def eval_transform(size=224):
+    return transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(size),
+        transforms.PILToTensor(),
+    ])
+
+_val_datasets = {}
+
+# One dataset object per val source for the whole process; training and every evaluation share it
+def load_val_dataset(val_shards=None):
+    if val_shards in _val_datasets:
+        return _val_datasets[val_shards]
+    if val_shards is not None:
+        # Pre-decoded shards from shard_dataset.py
+        dataset = ShardDataset(val_shards, transform=shard_eval_transform())
+    else:
+        # Load test data (replace with your dataset path); the file list comes from the cached index (file_index.py)
+        # JPEGs are decoded at the smallest DCT scale that still covers Resize(256)
+        dataset = IndexedImageFolder(root=VAL_DIR, transform=eval_transform(), loader=draft_loader(256))
+    _val_datasets[val_shards] = dataset
+    return dataset
+
+def run_evaluation(model, test_loader, device_config, num_classes=1000, warmup_steps=0):
+    """Single pass over `test_loader` with an eval-mode model; returns (EvalMetrics, ThroughputMeter)."""
+    # Counts stay on the device and are read back once at the end
+    confusion = torch.zeros(num_classes * num_classes, dtype=torch.int64, device=device_config.device)
+    top5_correct = torch.zeros((), dtype=torch.int64, device=device_config.device)
+    meter = ThroughputMeter(warmup_steps)
+
+    with torch.no_grad():
+        for inputs, labels in meter.track(test_loader):
+            inputs, labels = device_config.to_device(inputs, labels)
+            with device_config.autocast():
+                outputs = model(inputs)
+            top5 = outputs.topk(min(5, num_classes), dim=1).indices
+            confusion += torch.bincount(labels * num_classes + top5[:, 0], minlength=num_classes * num_classes)
+            top5_correct += (top5 == labels.unsqueeze(1)).any(dim=1).sum()
+
+    confusion = confusion.view(num_classes, num_classes).cpu()
+    classes = getattr(getattr(test_loader, 'dataset', test_loader), 'classes', None)
+    return EvalMetrics(confusion, int(top5_correct), classes), meter
+
+class Evaluator:
+    """Per-epoch evaluation whose val loader, worker pool and metric buffers outlive each call.
+
+    The DataLoader is built once with persistent workers, so every `evaluate`
+    reuses the same worker processes instead of forking a new pool per epoch,
+    and the device-side counters are zeroed in place rather than reallocated.
+    A `val_cache` (val_cache.py) is iterated directly and needs no workers.
+    """
+
+    def __init__(self, device_config, val_shards=None, val_cache=None, dataset=None, batch_size=32, num_workers=None,
+                 prefetch_factor=2, persistent_workers=True, pin_memory=None, seed=None, profile=False):
+        self.device_config = device_config
+        if val_cache is not None:
+            # Already preprocessed; batches come straight from the memory map
+            self.loader = val_cache
+        else:
+            self.loader = make_loader(dataset if dataset is not None else load_val_dataset(val_shards),
+                                      batch_size=batch_size, shuffle=False, num_workers=num_workers,
+                                      prefetch_factor=prefetch_factor, persistent_workers=persistent_workers,
+                                      pin_memory=pin_memory, seed=seed, channels_last=device_config.channels_last)
+        self.stats = MetricAccumulator(device_config.device)
+        self.meter = ThroughputMeter()
+        self.timer = PhaseTimer(device_config.device, enabled=profile)
+
+    def evaluate(self, model):
+        """Top-1 accuracy (in %) of `model` on the val set; the model is left in eval mode."""
+        model.eval()
+        self.stats.reset()
+        self.meter.reset()
+        self.timer.reset()
+        with torch.no_grad():
+            for inputs, labels in self.timer.track(self.meter.track(self.loader)):
+                with self.timer.phase('h2d'):
+                    inputs, labels = self.device_config.to_device(inputs, labels)
+                with self.timer.phase('forward'), self.device_config.autocast():
+                    outputs = model(inputs)
+                self.stats.update(outputs, labels)
+
+        accuracy = self.stats.accuracy
+        print(f'Test accuracy after epoch: {accuracy:.2f}%')
+        self.meter.report('Evaluation throughput')
+        self.timer.report('Evaluation phases')
+        return accuracy
+
+# Checkpoint identity: content hash plus mtime, so a rewritten file is never served stale results
+def checkpoint_key(model_path):
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest(), os.stat(model_path).st_mtime_ns
+
+_metrics_cache = {}
+
+def evaluate_checkpoint(model_path='resnet50_imagenet_model.pth', val_shards=None, num_workers=None,
+                        prefetch_factor=2, pin_memory=None, device=None, num_threads=None, channels_last=None,
+                        amp=None, fuse_bn=True, compile=None, arch='resnet50', width_multiplier=1.0,
+                        depth_multiplier=1.0):
+    """Evaluate a saved model once and cache the EvalMetrics for that checkpoint file."""
+    # The checkpoint, data, model construction and execution options are part of the key; loader settings are not
+    checkpoint_hash, mtime = checkpoint_key(model_path)
+    key = (checkpoint_hash, mtime, val_shards, device, amp, arch, width_multiplier, depth_multiplier, fuse_bn, compile)
+    if key in _metrics_cache:
+        return _metrics_cache[key]
+
+    device_config = setup_device(device, num_threads=num_threads, channels_last=channels_last, amp=amp)
+
+    # Load the model
+    model = create_model(arch, num_classes=1000, width_multiplier=width_multiplier, depth_multiplier=depth_multiplier)
+    model.load_state_dict(torch.load(model_path, map_location=device_config.device))
+    model.eval()  # Set the model to evaluation mode
+    if fuse_bn:
+        model.fuse_for_inference()  # Fold BatchNorm into the convs; outputs are unchanged
+        model.fold_input_normalization()  # The val loader ships uint8
+    model = device_config.prepare_model(model)
+    # Frozen TorchScript bakes in the weights, so its cache is per checkpoint and configuration
+    model = compile_model(model, compile,
+                          cache_key=f'{checkpoint_hash[:16]}-{device_config.device.type}-{fuse_bn}-{device_config.channels_last}')
+
+    test_loader = make_loader(load_val_dataset(val_shards), batch_size=32, shuffle=False, num_workers=num_workers,
+                              prefetch_factor=prefetch_factor, persistent_workers=False, pin_memory=pin_memory,
+                              channels_last=device_config.channels_last)
+
+    metrics, meter = run_evaluation(model, test_loader, device_config, warmup_steps=2 if compile not in (None, 'off') else 0)
+    logging.info(f'Evaluated {model_path}: {metrics}')
+    meter.report('Evaluation throughput')
+    _metrics_cache[key] = metrics
+    return metrics
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+import numpy as np
+import torchvision.datasets as datasets
+from torchvision.datasets.folder import IMG_EXTENSIONS, default_loader, find_classes, make_dataset
+
+META_FILE = 'meta.json'
+PATHS_FILE = 'paths.bin'
+OFFSETS_FILE = 'offsets.npy'
+LABELS_FILE = 'labels.npy'
+
+# Indexes live on local disk, next to nothing in the (possibly network-mounted, read-only) dataset tree
+INDEX_DIR = os.environ.get('FILE_INDEX_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'resnet-file-index'))
+
+def index_path(root, index_dir=None):
+    key = hashlib.sha256(os.path.realpath(root).encode()).hexdigest()[:16]
+    return os.path.join(index_dir or INDEX_DIR, key)
+
+def tree_mtimes(root, classes):
+    # A file added to or removed from a class directory changes that directory's mtime; a new class changes root's
+    return [os.stat(root).st_mtime_ns] + [os.stat(os.path.join(root, name)).st_mtime_ns for name in classes]
+
+# Ranks on one node may build the same index at once; each writes its own temporary file
+def _write(path, write):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+def build_index(root, index_dir=None):
+    """Scan an ImageFolder tree once and write its file list and labels; returns the index directory."""
+    out_dir = index_path(root, index_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    classes, class_to_idx = find_classes(root)
+    if len(classes) > np.iinfo(np.int16).max + 1:
+        raise ValueError(f'{root} has {len(classes)} classes; the index stores labels as int16')
+    # Taken before the scan, so a file added during it invalidates the index on the next load
+    mtimes = tree_mtimes(root, classes)
+    samples = make_dataset(root, class_to_idx, IMG_EXTENSIONS)
+
+    # Paths relative to root, as one UTF-8 blob with end offsets: no per-sample Python objects to load or fork
+    # (make_dataset joins onto the expanded root, so the prefix is stripped by length rather than relpath)
+    prefix = len(os.path.join(os.path.expanduser(root), ''))
+    encoded = [path[prefix:].encode() for path, _ in samples]
+    offsets = np.cumsum([len(path) for path in encoded], dtype=np.int64)
+    labels = np.asarray([target for _, target in samples], dtype=np.int16)
+    _write(os.path.join(out_dir, PATHS_FILE), lambda f: f.write(b''.join(encoded)))
+    _write(os.path.join(out_dir, OFFSETS_FILE), lambda f: np.save(f, offsets))
+    _write(os.path.join(out_dir, LABELS_FILE), lambda f: np.save(f, labels))
+
+    # Metadata is written last, so an interrupted build is redone on the next run
+    meta = {'root': os.path.realpath(root), 'classes': classes, 'mtimes': mtimes, 'num_samples': len(samples)}
+    _write(os.path.join(out_dir, META_FILE), lambda f: f.write(json.dumps(meta).encode()))
+    logging.info(f'Indexed {len(samples)} files in {len(classes)} classes under {root} '
+                 f'in {time.perf_counter() - start:.1f}s')
+    return out_dir
+
+def load_index(root, index_dir=None):
+    """(classes, path blob, offsets, labels) from a current index, or None if it is missing or stale."""
+    out_dir = index_path(root, index_dir)
+    try:
+        with open(os.path.join(out_dir, META_FILE)) as f:
+            meta = json.load(f)
+        if meta['root'] != os.path.realpath(root) or meta['mtimes'] != tree_mtimes(root, meta['classes']):
+            return None
+        with open(os.path.join(out_dir, PATHS_FILE), 'rb') as f:
+            paths = np.frombuffer(f.read(), dtype=np.uint8)
+        offsets = np.load(os.path.join(out_dir, OFFSETS_FILE))
+        labels = np.load(os.path.join(out_dir, LABELS_FILE))
+    except (OSError, ValueError, KeyError):
+        return None
+    if len(offsets) != meta['num_samples'] or len(labels) != meta['num_samples']:
+        return None
+    return meta['classes'], paths, offsets, labels
+
+class IndexedImageFolder(datasets.VisionDataset):
+    """ImageFolder whose file list comes from a cached index instead of a directory walk.
+
+    The first construction for a root scans it like ImageFolder and writes the
+    index; later ones only stat the root and class directories (to catch
+    added or removed files) and load the index. Samples, labels and class
+    order are the same as ImageFolder's. Paths and labels are kept as numpy
+    arrays, so DataLoader workers share them without copy-on-write faults.
+    """
+
+    def __init__(self, root, transform=None, target_transform=None, loader=default_loader, index_dir=None):
+        super(IndexedImageFolder, self).__init__(root, transform=transform, target_transform=target_transform)
+        self.loader = loader
+        index = load_index(root, index_dir)
+        if index is None:
+            build_index(root, index_dir)
+            index = load_index(root, index_dir)
+            if index is None:
+                raise RuntimeError(f'{root} changed while it was being indexed')
+        self.classes, self._paths, self._offsets, self.targets = index
+        self.class_to_idx = {name: i for i, name in enumerate(self.classes)}
+
+    def path(self, index):
+        start = self._offsets[index - 1] if index > 0 else 0
+        return os.path.join(self.root, self._paths[start:self._offsets[index]].tobytes().decode())
+
+    @property
+    def samples(self):
+        # Built on demand; prefer path(i) and targets[i]
+        return [(self.path(i), int(target)) for i, target in enumerate(self.targets)]
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, index):
+        sample = self.loader(self.path(index))
+        target = int(self.targets[index])
+        if self.transform is not None:
+            sample = self.transform(sample)
+        if self.target_transform is not None:
+            target = self.target_transform(target)
+        return sample, target
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Build (or refresh) the cached file index of ImageFolder trees.')
+    parser.add_argument('roots', nargs='+', help='ImageFolder directories (e.g. .../imagenet-mini/train)')
+    parser.add_argument('--index-dir', default=None, help=f'Where indexes are kept (default: {INDEX_DIR})')
+    args = parser.parse_args()
+    for root in args.roots:
+        if load_index(root, args.index_dir) is None:
+            build_index(root, args.index_dir)
+        else:
+            logging.info(f'Index for {root} is current')
@@ -0,0 +1,52 @@
+import math
+from PIL import Image
+import torchvision.transforms as transforms
+
+def draft_decode(image, min_short_side):
+    """Decode a lazily opened image at the smallest JPEG DCT scale (1/2, 1/4, 1/8) whose short side is still
+    at least `min_short_side`, and return it as RGB. Non-JPEG images decode at full size."""
+    width, height = image.size
+    scale = min_short_side / min(width, height)
+    if scale < 1:
+        # draft() picks the largest reduction whose size still covers the request in both dimensions
+        image.draft('RGB', (math.ceil(width * scale), math.ceil(height * scale)))
+    return image.convert('RGB')
+
+def draft_loader(min_short_side=256):
+    """ImageFolder `loader` for Resize(min_short_side) pipelines: the resize then starts from fewer pixels."""
+    def load(path):
+        with open(path, 'rb') as f:
+            return draft_decode(Image.open(f), min_short_side)
+    return load
+
+# ImageFolder `loader` that only reads the header; DraftRandomResizedCrop decodes
+def lazy_loader(path):
+    return Image.open(path)
+
+class DraftRandomResizedCrop:
+    """RandomResizedCrop for lazily opened images that decodes only as many pixels as the crop needs.
+
+    The crop box is sampled on the full-resolution size from the header,
+    exactly as RandomResizedCrop does. The image is then decoded at the
+    largest DCT reduction that keeps the box at least `size` pixels on each
+    side, and the box is rescaled to the decoded image. With `resize=False`
+    the cropped region is returned unresized (for BatchAugment(crop=False)).
+    """
+
+    def __init__(self, size=224, scale=(0.08, 1.0), ratio=(3 / 4, 4 / 3), resize=True):
+        self.size = size
+        self.scale = scale
+        self.ratio = ratio
+        self.resize = resize
+
+    def __call__(self, image):
+        width, height = image.size
+        top, left, h, w = transforms.RandomResizedCrop.get_params(image, self.scale, self.ratio)
+        decoded = draft_decode(image, self.size * min(width, height) / min(h, w))
+        image.close()
+        sx, sy = decoded.width / width, decoded.height / height
+        box = (left * sx, top * sy, (left + w) * sx, (top + h) * sy)
+        if self.resize:
+            # PIL resamples straight from the fractional box
+            return decoded.resize((self.size, self.size), Image.BILINEAR, box=box)
+        return decoded.crop(tuple(round(v) for v in box))
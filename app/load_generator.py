@@ -0,0 +1,122 @@
+import io
+import os
+import glob
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+import http.client
+import numpy as np
+from PIL import Image
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=60):
+        super(UnixHTTPConnection, self).__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+def load_images(image_dir=None, num_images=16, image_size=256, seed=0):
+    """Encoded request bodies: JPEGs from `image_dir`, or random-noise JPEGs when none is given."""
+    if image_dir is not None:
+        paths = sorted(glob.glob(os.path.join(image_dir, '**', '*.JPEG'), recursive=True) +
+                       glob.glob(os.path.join(image_dir, '**', '*.jpg'), recursive=True))[:num_images]
+        if not paths:
+            raise FileNotFoundError(f'No JPEG images under {image_dir}')
+        images = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                images.append(f.read())
+        return images
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(num_images):
+        buffer = io.BytesIO()
+        Image.fromarray(rng.integers(0, 256, (image_size, image_size, 3), dtype=np.uint8)).save(buffer, 'JPEG')
+        images.append(buffer.getvalue())
+    return images
+
+def run_load(images, num_requests=1000, concurrency=16, host='127.0.0.1', port=8000, unix_socket=None, topk=5):
+    """Send `num_requests` predictions from `concurrency` keep-alive clients; returns the latency summary."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(num_requests))
+
+    def client():
+        connection = UnixHTTPConnection(unix_socket) if unix_socket else http.client.HTTPConnection(host, port, timeout=60)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            start = time.perf_counter()
+            try:
+                connection.request('POST', f'/predict?topk={topk}', body=images[i % len(images)],
+                                   headers={'Content-Type': 'application/octet-stream'})
+                response = connection.getresponse()
+                body = response.read()
+                if response.status != 200:
+                    raise RuntimeError(f'HTTP {response.status}: {body[:200]!r}')
+            except Exception as error:
+                with lock:
+                    errors.append(str(error))
+                connection.close()
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+        connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    summary = {'requests': num_requests, 'concurrency': concurrency, 'succeeded': len(latencies),
+               'errors': len(errors), 'seconds': elapsed, 'requests_per_s': len(latencies) / elapsed}
+    if len(latencies):
+        for q in (50, 95, 99):
+            summary[f'p{q}_ms'] = float(np.percentile(latencies, q))
+    if errors:
+        logging.warning(f'{len(errors)} requests failed, first error: {errors[0]}')
+    return summary
+
+def server_stats(host='127.0.0.1', port=8000, unix_socket=None):
+    connection = UnixHTTPConnection(unix_socket) if unix_socket else http.client.HTTPConnection(host, port, timeout=60)
+    connection.request('GET', '/stats')
+    stats = json.loads(connection.getresponse().read())
+    connection.close()
+    return stats
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Load generator for serve.py: throughput and latency percentiles.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix-socket', default=None)
+    parser.add_argument('--image-dir', default=None, help='Send JPEGs from this directory (default: random images)')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--topk', type=int, default=5)
+    parser.add_argument('--output-json', default=None)
+    args = parser.parse_args()
+
+    images = load_images(args.image_dir)
+    summary = run_load(images, args.requests, args.concurrency, args.host, args.port, args.unix_socket, args.topk)
+    summary['server'] = server_stats(args.host, args.port, args.unix_socket)
+    logging.info(f'{summary["succeeded"]}/{summary["requests"]} requests in {summary["seconds"]:.1f}s: '
+                 f'{summary["requests_per_s"]:.1f} requests/s, p50 {summary.get("p50_ms", float("nan")):.1f} ms, '
+                 f'p95 {summary.get("p95_ms", float("nan")):.1f} ms, p99 {summary.get("p99_ms", float("nan")):.1f} ms, '
+                 f'mean server batch {summary["server"]["mean_batch_size"]:.1f}')
+    if args.output_json:
+        with open(args.output_json, 'w') as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,22 @@
+import logging
+from torch.optim.lr_scheduler import LambdaLR
+
+def linear_scaling_warmup(optimizer, base_batch_size, effective_batch_size, warmup_steps):
+    """Linear LR scaling rule with a linear warmup, stepped once per optimizer update.
+
+    The optimizer's learning rate is taken as tuned for `base_batch_size`; it
+    ramps up to `effective_batch_size / base_batch_size` times that value over
+    `warmup_steps` updates and then stays there. Jumping straight to a large
+    scaled rate tends to diverge in the first epochs.
+    """
+    scale = effective_batch_size / base_batch_size
+    warmup_steps = max(warmup_steps, 0) if scale != 1 else 0
+
+    def factor(step):
+        if step >= warmup_steps:
+            return scale
+        return 1 + (scale - 1) * step / warmup_steps
+
+    logging.info(f'Learning rate scaled by {scale:g} (effective batch {effective_batch_size}, '
+                 f'base batch {base_batch_size}), warmup over {warmup_steps} updates')
+    return LambdaLR(optimizer, factor)
@@ -0,0 +1,57 @@
+import torch
+import torch.distributed as dist
+
+class MetricAccumulator:
+    """Running loss and top-1 counts kept as device tensors.
+
+    `update` never synchronizes with the device; only `loss`/`accuracy` do, so
+    call them at a logging interval or at the end of an epoch. Loss is summed in
+    float64, the same as the `running_loss += loss.item()` it replaces.
+    """
+
+    def __init__(self, device):
+        self.device = torch.device(device)
+        self.loss_sum = torch.zeros((), dtype=torch.float64, device=self.device)
+        self.correct = torch.zeros((), dtype=torch.int64, device=self.device)
+        self.reset()
+
+    def reset(self):
+        # Zeroed in place, so an accumulator reused every epoch keeps its device buffers
+        self.loss_sum.zero_()
+        self.correct.zero_()
+        self.total = 0  # batch sizes are known on the host
+        self.steps = 0
+
+    def update(self, outputs, labels, loss=None):
+        if loss is not None:
+            self.loss_sum += loss.detach()
+        _, predicted = torch.max(outputs.detach(), 1)
+        self.correct += (predicted == labels).sum()
+        self.total += labels.size(0)
+        self.steps += 1
+
+    def state_dict(self):
+        return {'loss_sum': self.loss_sum, 'correct': self.correct, 'total': self.total, 'steps': self.steps}
+
+    def load_state_dict(self, state):
+        self.loss_sum.copy_(state['loss_sum'])
+        self.correct.copy_(state['correct'])
+        self.total = state['total']
+        self.steps = state['steps']
+
+    def all_reduce(self):
+        """Sum the counts over all ranks so every rank reports the global epoch numbers."""
+        if not (dist.is_available() and dist.is_initialized()):
+            return
+        counts = torch.tensor([self.total, self.steps], dtype=torch.int64, device=self.device)
+        for tensor in (self.loss_sum, self.correct, counts):
+            dist.all_reduce(tensor)
+        self.total, self.steps = counts.tolist()
+
+    @property
+    def loss(self):
+        return self.loss_sum.item() / max(self.steps, 1)
+
+    @property
+    def accuracy(self):
+        return 100 * self.correct.item() / max(self.total, 1)
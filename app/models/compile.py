@@ -0,0 +1,56 @@
+import os
+import time
+import logging
+import torch
+
+COMPILE_MODES = ('off', 'inductor', 'jit')
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'resnet-imagenet')
+
+def compile_model(model, mode='inductor', cache_dir=DEFAULT_CACHE_DIR, cache_key=None):
+    """Wrap `model` for compiled execution, falling back to eager if compilation fails.
+
+    'inductor' uses torch.compile, with the inductor FX graph cache kept under
+    `cache_dir` so later runs skip most code generation. 'jit' scripts the
+    model and, in eval mode, freezes and optimizes it for inference; frozen
+    modules are cached under `cache_dir` when a `cache_key` (e.g. checkpoint
+    hash) identifies the weights. The returned module shares its parameters
+    with `model`.
+    """
+    if mode is None or mode == 'off':
+        return model
+    if mode not in COMPILE_MODES:
+        raise ValueError(f'Unknown compile mode {mode!r}; expected one of {COMPILE_MODES}')
+
+    start = time.perf_counter()
+    try:
+        if mode == 'inductor':
+            if cache_dir is not None:
+                os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', os.path.join(cache_dir, 'inductor'))
+            # Graphs that fail to compile run eagerly instead of raising mid-training
+            torch._dynamo.config.suppress_errors = True
+            compiled = torch.compile(model)
+        else:
+            cache_path = None
+            if cache_dir is not None and cache_key is not None and not model.training:
+                cache_path = os.path.join(cache_dir, 'jit', f'{cache_key}.pt')
+            if cache_path is not None and os.path.exists(cache_path):
+                compiled = torch.jit.load(cache_path)
+                logging.info(f'Loaded frozen TorchScript model from {cache_path}')
+            else:
+                compiled = torch.jit.script(model)
+                if not model.training:
+                    compiled = torch.jit.freeze(compiled)
+                    if cache_path is not None:
+                        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                        torch.jit.save(compiled, cache_path)
+            if not model.training:
+                # Applied after caching: the prepacked oneDNN weights it creates cannot be serialized
+                compiled = torch.jit.optimize_for_inference(compiled)
+    except Exception as error:
+        logging.warning(f'{mode} compilation failed, running eagerly: {error}')
+        return model
+
+    # torch.compile and the TorchScript profiling executor do most of their work on the first calls
+    logging.info(f'Prepared {mode} compiled model in {time.perf_counter() - start:.1f}s; '
+                 f'code generation continues during the first steps')
+    return compiled
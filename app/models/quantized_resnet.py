@@ -0,0 +1,64 @@
+import torch.nn as nn
+from torch.ao.quantization import QuantStub, DeQuantStub, fuse_modules
+from models.resnet_model import Bottleneck, ResNet
+
+class QuantizableBottleneck(Bottleneck):
+    """Bottleneck with one ReLU module per use and a quantizable residual add.
+
+    The parameters are identical to `Bottleneck`, so fp32 checkpoints load as-is.
+    """
+
+    def __init__(self, in_channels, out_channels, stride=1, downsample=None):
+        super(QuantizableBottleneck, self).__init__(in_channels, out_channels, stride, downsample)
+        # fuse_modules needs a distinct ReLU after each conv-bn pair
+        self.relu1 = nn.ReLU(inplace=True)
+        self.relu2 = nn.ReLU(inplace=True)
+        del self.relu
+        self.skip_add_relu = nn.quantized.FloatFunctional()
+
+    def forward(self, x):
+        identity = x
+
+        out = self.conv1(x)
+        out = self.bn1(out)
+        out = self.relu1(out)
+
+        out = self.conv2(out)
+        out = self.bn2(out)
+        out = self.relu2(out)
+
+        out = self.conv3(out)
+        out = self.bn3(out)
+
+        if self.downsample is not None:
+            identity = self.downsample(x)
+
+        # out += identity; relu(out), as a single op that has an int8 kernel
+        return self.skip_add_relu.add_relu(out, identity)
+
+    def fuse_model(self):
+        fuse_modules(self, [['conv1', 'bn1', 'relu1'], ['conv2', 'bn2', 'relu2'], ['conv3', 'bn3']], inplace=True)
+        if self.downsample is not None:
+            fuse_modules(self.downsample, ['0', '1'], inplace=True)
+
+class QuantizableResNet(ResNet):
+    def __init__(self, block, layers, num_classes=1000, **kwargs):
+        super(QuantizableResNet, self).__init__(block, layers, num_classes, **kwargs)
+        self.quant = QuantStub()
+        self.dequant = DeQuantStub()
+
+    def forward(self, x):
+        x = self._normalize_input(x)  # uint8 inputs are normalized in float, before quantization
+        x = self.quant(x)
+        x = self._forward_impl(x)
+        return self.dequant(x)
+
+    def fuse_model(self):
+        """Fuse conv+bn(+relu) triples in place; call in eval mode before quantization."""
+        fuse_modules(self, ['conv1', 'bn1', 'relu'], inplace=True)
+        for module in self.modules():
+            if isinstance(module, QuantizableBottleneck):
+                module.fuse_model()
+
+def QuantizableResNet50(num_classes=1000):
+    return QuantizableResNet(QuantizableBottleneck, [3, 4, 6, 3], num_classes)
@@ -1,5 +1,70 @@
+import contextlib
 import torch
 import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+from torch.utils.checkpoint import checkpoint
+from models.compile import compile_model
+
+# Fold an eval-mode BatchNorm into the preceding conv's weight and bias
+def _fold_bn(conv, bn):
+    return fuse_conv_bn_eval(conv, bn), nn.Identity()
+
+STAGES = ('layer1', 'layer2', 'layer3', 'layer4')
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+# Recomputing a checkpointed block must not move the BatchNorm running stats or batch counts a second time
+@contextlib.contextmanager
+def _frozen_bn_stats(module):
+    bns = [m for m in module.modules() if isinstance(m, nn.BatchNorm2d)]
+    momenta = [bn.momentum for bn in bns]
+    counts = [bn.num_batches_tracked.clone() if bn.num_batches_tracked is not None else None for bn in bns]
+    for bn in bns:
+        bn.momentum = 0.0
+    try:
+        yield
+    finally:
+        for bn, momentum, count in zip(bns, momenta, counts):
+            bn.momentum = momentum
+            if count is not None:
+                bn.num_batches_tracked.copy_(count)
+
+class BasicBlock(nn.Module):
+    expansion = 1
+
+    def __init__(self, in_channels, out_channels, stride=1, downsample=None):
+        super(BasicBlock, self).__init__()
+        self.conv1 = nn.Conv2d(in_channels, out_channels, kernel_size=3, stride=stride, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(out_channels)
+        self.conv2 = nn.Conv2d(out_channels, out_channels, kernel_size=3, padding=1, bias=False)
+        self.bn2 = nn.BatchNorm2d(out_channels)
+        self.relu = nn.ReLU(inplace=True)
+        self.downsample = downsample
+
+    def forward(self, x):
+        identity = x
+
+        out = self.conv1(x)
+        out = self.bn1(out)
+        out = self.relu(out)
+
+        out = self.conv2(out)
+        out = self.bn2(out)
+
+        if self.downsample is not None:
+            identity = self.downsample(x)
+
+        out += identity
+        out = self.relu(out)
+
+        return out
+
+    def fuse_for_inference(self):
+        self.conv1, self.bn1 = _fold_bn(self.conv1, self.bn1)
+        self.conv2, self.bn2 = _fold_bn(self.conv2, self.bn2)
+        if self.downsample is not None:
+            self.downsample[0], self.downsample[1] = _fold_bn(self.downsample[0], self.downsample[1])
 
 class Bottleneck(nn.Module):
     expansion = 4
@@ -37,22 +102,57 @@ class Bottleneck(nn.Module):
 
         return out
 
+    def fuse_for_inference(self):
+        self.conv1, self.bn1 = _fold_bn(self.conv1, self.bn1)
+        self.conv2, self.bn2 = _fold_bn(self.conv2, self.bn2)
+        self.conv3, self.bn3 = _fold_bn(self.conv3, self.bn3)
+        if self.downsample is not None:
+            self.downsample[0], self.downsample[1] = _fold_bn(self.downsample[0], self.downsample[1])
+
 class ResNet(nn.Module):
-    def __init__(self, block, layers, num_classes=1000):
+    # width_multiplier scales every stage's channel count, depth_multiplier the number of blocks per stage;
+    # checkpoint_stages lists the stages ('layer1'..'layer4') whose activations are recomputed in backward
+    def __init__(self, block, layers, num_classes=1000, width_multiplier=1.0, depth_multiplier=1.0,
+                 checkpoint_stages=()):
         super(ResNet, self).__init__()
-        self.in_channels = 64
-        self.conv1 = nn.Conv2d(3, 64, kernel_size=7, stride=2, padding=3, bias=False)
-        self.bn1 = nn.BatchNorm2d(64)
+        widths = [max(1, int(round(width * width_multiplier))) for width in (64, 128, 256, 512)]
+        layers = [max(1, int(round(blocks * depth_multiplier))) for blocks in layers]
+
+        self.in_channels = widths[0]
+        self.conv1 = nn.Conv2d(3, widths[0], kernel_size=7, stride=2, padding=3, bias=False)
+        self.bn1 = nn.BatchNorm2d(widths[0])
         self.relu = nn.ReLU(inplace=True)
         self.maxpool = nn.MaxPool2d(kernel_size=3, stride=2, padding=1)
 
-        self.layer1 = self._make_layer(block, 64, layers[0])
-        self.layer2 = self._make_layer(block, 128, layers[1], stride=2)
-        self.layer3 = self._make_layer(block, 256, layers[2], stride=2)
-        self.layer4 = self._make_layer(block, 512, layers[3], stride=2)
+        self.layer1 = self._make_layer(block, widths[0], layers[0])
+        self.layer2 = self._make_layer(block, widths[1], layers[1], stride=2)
+        self.layer3 = self._make_layer(block, widths[2], layers[2], stride=2)
+        self.layer4 = self._make_layer(block, widths[3], layers[3], stride=2)
 
         self.avgpool = nn.AdaptiveAvgPool2d((1, 1))
-        self.fc = nn.Linear(512 * block.expansion, num_classes)
+        self.fc = nn.Linear(widths[3] * block.expansion, num_classes)
+
+        # uint8 pixels (0-255) are normalized inside the model, so loaders can ship 1 byte per value;
+        # float inputs are taken as already normalized. Not persistent: checkpoints keep their keys
+        self.register_buffer('input_mean', torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1) * 255, persistent=False)
+        self.register_buffer('input_std', torch.tensor(IMAGENET_STD).view(1, 3, 1, 1) * 255, persistent=False)
+        self.input_std_folded = False
+
+        self.set_checkpoint_stages(checkpoint_stages)
+
+    def set_checkpoint_stages(self, stages):
+        """Enable activation checkpointing for the given stages, by name ('layer3') or number (3).
+
+        Each block of a checkpointed stage keeps only its input during the
+        forward pass and recomputes its activations in backward, trading about
+        one extra forward of that stage for the memory. Only applies in training.
+        """
+        names = {stage if isinstance(stage, str) else f'layer{stage}' for stage in stages}
+        unknown = names - set(STAGES)
+        if unknown:
+            raise ValueError(f'Unknown stages {sorted(unknown)}; expected names from {STAGES}')
+        # A list of bools keeps the attribute TorchScript-compatible
+        self.checkpoint_stages = [name in names for name in STAGES]
 
     def _make_layer(self, block, out_channels, blocks, stride=1):
         downsample = None
@@ -71,15 +171,33 @@ class ResNet(nn.Module):
         return nn.Sequential(*layers)
 
     def forward(self, x):
+        return self._forward_impl(self._normalize_input(x))
+
+    # Kept out of _forward_impl so subclasses can run it once before their own steps (TorchScript cannot call super())
+    def _normalize_input(self, x):
+        if x.dim() == 4 and x.shape[1] != 3 and x.shape[3] == 3:
+            x = x.permute(0, 3, 1, 2)  # NHWC batch -> channels_last NCHW view
+        if x.dtype == torch.uint8:
+            x = x.float() - self.input_mean
+            if not self.input_std_folded:
+                x = x / self.input_std
+        elif self.input_std_folded:
+            x = x * self.input_std
+        return x
+
+    def _forward_impl(self, x):
         x = self.conv1(x)
         x = self.bn1(x)
         x = self.relu(x)
         x = self.maxpool(x)
 
-        x = self.layer1(x)
-        x = self.layer2(x)
-        x = self.layer3(x)
-        x = self.layer4(x)
+        if self.training and any(self.checkpoint_stages) and not torch.jit.is_scripting():
+            x = self._checkpointed_stages(x)
+        else:
+            x = self.layer1(x)
+            x = self.layer2(x)
+            x = self.layer3(x)
+            x = self.layer4(x)
 
         x = self.avgpool(x)
         x = torch.flatten(x, 1)
@@ -87,5 +205,81 @@ class ResNet(nn.Module):
 
         return x
 
-def ResNet50(num_classes=1000):
-    return ResNet(Bottleneck, [3, 4, 6, 3], num_classes)
+    @torch.jit.unused
+    def _checkpointed_stages(self, x):
+        for name, enabled in zip(STAGES, self.checkpoint_stages):
+            stage = getattr(self, name)
+            if not enabled:
+                x = stage(x)
+                continue
+            for block in stage:
+                x = checkpoint(block, x, use_reentrant=False,
+                               context_fn=lambda block=block: (contextlib.nullcontext(), _frozen_bn_stats(block)))
+        return x
+
+    @torch.no_grad()
+    def fold_input_normalization(self):
+        """Fold the 1/std input scaling into conv1's weights, in place, and return the model.
+
+        uint8 inputs then only have the mean subtracted. The mean cannot be
+        folded exactly: conv1 zero-pads, and only mean-subtracted inputs pad
+        like normalized ones. Float inputs stay correct but pay a multiply, so
+        use this for uint8-fed inference, and do not train or save the folded model.
+        """
+        if not self.input_std_folded:
+            self.conv1.weight.div_(self.input_std)
+            self.input_std_folded = True
+        return self
+
+    @torch.no_grad()
+    def fuse_for_inference(self):
+        """Fold every BatchNorm into its preceding conv, in place, and return the model.
+
+        Only valid in eval mode, since it bakes the running statistics into the
+        weights; the model cannot be trained afterwards. The ReLUs are already
+        in-place; they get fused into the conv kernels when the folded model is
+        frozen with TorchScript or compiled, which the removed BatchNorms no
+        longer block.
+        """
+        if self.training:
+            raise RuntimeError('fuse_for_inference() requires eval mode; call model.eval() first')
+        self.conv1, self.bn1 = _fold_bn(self.conv1, self.bn1)
+        for module in self.modules():
+            if isinstance(module, (BasicBlock, Bottleneck)):
+                module.fuse_for_inference()
+        return self
+
+# compile: None/'off', 'inductor' (torch.compile) or 'jit' (TorchScript, frozen in eval mode), see models/compile.py;
+# other keyword arguments (width/depth multipliers, checkpoint_stages) go to ResNet
+def ResNet18(num_classes=1000, compile=None, **kwargs):
+    model = ResNet(BasicBlock, [2, 2, 2, 2], num_classes, **kwargs)
+    return compile_model(model, compile)
+
+def ResNet34(num_classes=1000, compile=None, **kwargs):
+    model = ResNet(BasicBlock, [3, 4, 6, 3], num_classes, **kwargs)
+    return compile_model(model, compile)
+
+def ResNet50(num_classes=1000, compile=None, **kwargs):
+    model = ResNet(Bottleneck, [3, 4, 6, 3], num_classes, **kwargs)
+    return compile_model(model, compile)
+
+def ResNet101(num_classes=1000, compile=None, **kwargs):
+    model = ResNet(Bottleneck, [3, 4, 23, 3], num_classes, **kwargs)
+    return compile_model(model, compile)
+
+def ResNet152(num_classes=1000, compile=None, **kwargs):
+    model = ResNet(Bottleneck, [3, 8, 36, 3], num_classes, **kwargs)
+    return compile_model(model, compile)
+
+MODELS = {
+    'resnet18': ResNet18,
+    'resnet34': ResNet34,
+    'resnet50': ResNet50,
+    'resnet101': ResNet101,
+    'resnet152': ResNet152,
+}
+
+def create_model(arch='resnet50', **kwargs):
+    if arch not in MODELS:
+        raise ValueError(f'Unknown model {arch!r}; expected one of {sorted(MODELS)}')
+    return MODELS[arch](**kwargs)
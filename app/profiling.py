@@ -0,0 +1,136 @@
+import os
+import time
+import logging
+import contextlib
+from collections import defaultdict
+import torch
+from torch.profiler import ProfilerActivity, profile, record_function, schedule
+
+class PhaseTimer:
+    """Wall time per named phase of a step (data, h2d, forward, backward, optimizer, ...).
+
+    Disabled timers cost nothing. Enabled ones synchronize the device when a
+    phase ends so asynchronous CUDA work is charged to the phase that queued
+    it, and label the phase for torch.profiler traces.
+    """
+
+    def __init__(self, device, enabled=True):
+        self.device = torch.device(device)
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.times = defaultdict(float)
+        self.steps = 0
+
+    def _sync(self):
+        if self.device.type == 'cuda':
+            torch.cuda.synchronize(self.device)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        with record_function(name):
+            start = time.perf_counter()
+            yield
+            self._sync()
+        self.times[name] += time.perf_counter() - start
+
+    def phase(self, name):
+        return self._timed(name) if self.enabled else contextlib.nullcontext()
+
+    def track(self, loader):
+        """Iterate `loader`, charging the time spent waiting for each batch to the 'data' phase."""
+        iterator = iter(loader)
+        while True:
+            with self.phase('data'):
+                try:
+                    batch = next(iterator)
+                except StopIteration:
+                    return
+            yield batch
+            self.steps += 1
+
+    def report(self, desc='Step phases'):
+        total = sum(self.times.values())
+        if not self.enabled or total == 0:
+            return
+        phases = ', '.join(f'{name} {1000 * seconds / max(self.steps, 1):.1f}ms ({100 * seconds / total:.0f}%)'
+                           for name, seconds in self.times.items())
+        logging.info(f'{desc} per step over {self.steps} steps: {phases}')
+
+class StageProfiler:
+    """Forward hooks on each ResNet stage recording its time and output activation bytes.
+
+    Only stages called as modules are seen: eager models, and not the stages
+    run under activation checkpointing (their blocks are called one by one).
+    """
+
+    STAGES = ('conv1', 'layer1', 'layer2', 'layer3', 'layer4', 'fc')
+
+    def __init__(self, model, device):
+        self.device = torch.device(device)
+        self.handles = []
+        self._starts = {}
+        self.reset()
+        for name in self.STAGES:
+            module = getattr(model, name, None)
+            if module is None:
+                continue
+            self.handles.append(module.register_forward_pre_hook(self._pre_hook(name)))
+            self.handles.append(module.register_forward_hook(self._hook(name)))
+
+    def reset(self):
+        self.times = defaultdict(float)
+        self.activation_bytes = {}
+        self.calls = defaultdict(int)
+
+    def _sync(self):
+        if self.device.type == 'cuda':
+            torch.cuda.synchronize(self.device)
+
+    def _pre_hook(self, name):
+        def hook(module, inputs):
+            self._sync()
+            self._starts[name] = time.perf_counter()
+        return hook
+
+    def _hook(self, name):
+        def hook(module, inputs, output):
+            self._sync()
+            self.times[name] += time.perf_counter() - self._starts.pop(name)
+            self.calls[name] += 1
+            self.activation_bytes[name] = output.numel() * output.element_size()
+        return hook
+
+    def report(self, desc='Stage forward'):
+        if not self.calls:
+            return
+        for name in self.STAGES:
+            if name in self.calls:
+                logging.info(f'{desc} {name}: {1000 * self.times[name] / self.calls[name]:.2f}ms per call, '
+                             f'output activations {self.activation_bytes[name] / 2**20:.1f} MiB')
+
+    def remove(self):
+        for handle in self.handles:
+            handle.remove()
+        self.handles = []
+
+def trace_profiler(trace_dir, start_step, num_steps, device, prefix='train'):
+    """torch.profiler over steps [start_step, start_step + num_steps), exported as a Chrome trace.
+
+    Call `.step()` after every step; open the JSON in chrome://tracing or Perfetto.
+    """
+    os.makedirs(trace_dir, exist_ok=True)
+    activities = [ProfilerActivity.CPU]
+    if torch.device(device).type == 'cuda':
+        activities.append(ProfilerActivity.CUDA)
+
+    def export(profiler):
+        path = os.path.join(trace_dir, f'{prefix}-step{profiler.step_num}-pid{os.getpid()}.json')
+        profiler.export_chrome_trace(path)
+        logging.info(f'Wrote profiler trace to {path}')
+
+    # One warmup step before the window so profiler start-up is not in the trace
+    warmup = 1 if start_step > 0 else 0
+    return profile(activities=activities, record_shapes=True, profile_memory=True, on_trace_ready=export,
+                   schedule=schedule(wait=start_step - warmup, warmup=warmup, active=num_steps, repeat=1))
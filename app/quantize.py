@@ -0,0 +1,91 @@
+import logging
+import argparse
+import torch
+from torch.utils.data import Subset
+from models.resnet_model import ResNet50
+from models.quantized_resnet import QuantizableResNet50
+from data_loading import make_loader
+from device import DeviceConfig, setup_device
+from evaluation import load_val_dataset
+from test_model import evaluate_accuracy
+
+def select_backend(backend='x86'):
+    # 'x86' (fbgemm + onednn heuristics) only exists on newer PyTorch builds
+    if backend not in torch.backends.quantized.supported_engines:
+        backend = 'fbgemm'
+    torch.backends.quantized.engine = backend
+    return backend
+
+def calibration_loader(dataset, num_images=256, batch_size=32, num_workers=None, seed=0):
+    # A fixed random subset of the val set, so repeated runs calibrate identically
+    generator = torch.Generator()
+    generator.manual_seed(seed)
+    indices = torch.randperm(len(dataset), generator=generator)[:num_images].tolist()
+    return make_loader(Subset(dataset, indices), batch_size=batch_size, shuffle=False, num_workers=num_workers,
+                       persistent_workers=False, pin_memory=False, channels_last=True)
+
+def quantize_model(model, calibration_loader, backend='x86'):
+    """Post-training static int8 quantization of a `QuantizableResNet`, in place."""
+    backend = select_backend(backend)
+    model.eval()
+    model.fuse_model()
+    model.qconfig = torch.ao.quantization.get_default_qconfig(backend)
+    torch.ao.quantization.prepare(model, inplace=True)
+
+    # Observers record activation ranges over the calibration images
+    with torch.no_grad():
+        for inputs, _ in calibration_loader:
+            model(inputs)
+
+    torch.ao.quantization.convert(model, inplace=True)
+    logging.info(f'Quantized model to int8 with the {backend} backend')
+    return model
+
+def quantize_resnet50(model_path='resnet50_imagenet_model.pth', output_path='resnet50_imagenet_int8.pt',
+                      val_shards=None, calibration_images=256, backend='x86', num_workers=None, num_threads=None):
+    # Quantized kernels are CPU only; compare against fp32 on the same cores, without bf16 autocast
+    setup_device('cpu', num_threads=num_threads, amp='off')
+    device_config = DeviceConfig('cpu', channels_last=True)
+    state_dict = torch.load(model_path, map_location='cpu')
+
+    val_dataset = load_val_dataset(val_shards)
+    test_loader = make_loader(val_dataset, batch_size=32, shuffle=False, num_workers=num_workers,
+                              persistent_workers=False, pin_memory=False, channels_last=True)
+
+    # fp32 baseline, with BatchNorm folded like the int8 model
+    fp32_model = ResNet50(num_classes=1000)
+    fp32_model.load_state_dict(state_dict)
+    fp32_model.eval().fuse_for_inference()
+    fp32_model = device_config.prepare_model(fp32_model)
+    fp32_accuracy, fp32_meter = evaluate_accuracy(fp32_model, test_loader, device_config)
+
+    int8_model = QuantizableResNet50(num_classes=1000)
+    int8_model.load_state_dict(state_dict)
+    quantize_model(int8_model, calibration_loader(val_dataset, calibration_images, num_workers=num_workers), backend)
+    int8_accuracy, int8_meter = evaluate_accuracy(int8_model, test_loader, device_config)
+
+    # Compare model time only, so loader speed does not dilute the speedup
+    fp32_ips = fp32_meter.images / fp32_meter.compute_time
+    int8_ips = int8_meter.images / int8_meter.compute_time
+    logging.info(f'fp32 accuracy: {fp32_accuracy:.2f}%, {fp32_ips:.1f} images/s')
+    logging.info(f'int8 accuracy: {int8_accuracy:.2f}%, {int8_ips:.1f} images/s')
+    logging.info(f'Accuracy delta: {int8_accuracy - fp32_accuracy:+.2f} points, speedup: {int8_ips / fp32_ips:.2f}x')
+
+    if output_path:
+        torch.jit.save(torch.jit.script(int8_model), output_path)
+        logging.info(f'Saved int8 TorchScript model to {output_path}')
+    return int8_model
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Post-training int8 static quantization of ResNet50 for CPU.')
+    parser.add_argument('--model-path', default='resnet50_imagenet_model.pth')
+    parser.add_argument('--output-path', default='resnet50_imagenet_int8.pt')
+    parser.add_argument('--val-shards', default=None, help='Shard directory from shard_dataset.py instead of ImageFolder')
+    parser.add_argument('--calibration-images', type=int, default=256)
+    parser.add_argument('--backend', default='x86', choices=['x86', 'fbgemm'])
+    parser.add_argument('--num-workers', type=int, default=None)
+    parser.add_argument('--num-threads', type=int, default=None)
+    args = parser.parse_args()
+    quantize_resnet50(args.model_path, args.output_path, args.val_shards, args.calibration_images, args.backend,
+                      args.num_workers, args.num_threads)
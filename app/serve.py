@@ -0,0 +1,214 @@
+import io
+import os
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+import socketserver
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import torch
+from PIL import Image
+from models.resnet_model import MODELS, create_model
+from models.compile import compile_model
+from evaluation import eval_transform
+from jpeg_draft import draft_decode
+from device import setup_device
+
+class DynamicBatcher:
+    """Groups concurrent single-image requests into batches for a pool of model workers.
+
+    A worker takes the oldest waiting image, then keeps collecting until it has
+    `max_batch_size` images or `max_wait_ms` have passed since that first
+    image arrived, and answers every request in the batch with its top-k.
+    """
+
+    def __init__(self, model, device_config, max_batch_size=32, max_wait_ms=5.0, num_workers=1):
+        self.model = model
+        self.device_config = device_config
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.images = 0
+        self._lock = threading.Lock()
+        self.workers = [threading.Thread(target=self._worker, daemon=True, name=f'batcher-{i}')
+                        for i in range(num_workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, image, topk=5):
+        """Queue a preprocessed CHW tensor; the Future resolves to a list of (class index, probability)."""
+        future = Future()
+        self.requests.put((time.perf_counter(), image, topk, future))
+        return future
+
+    def _collect(self):
+        first = self.requests.get()
+        batch = [first]
+        deadline = first[0] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                batch.append(self.requests.get(timeout=timeout) if timeout > 0 else self.requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            try:
+                inputs = torch.stack([image for _, image, _, _ in batch])
+                inputs, _ = self.device_config.to_device(inputs, torch.empty(0, dtype=torch.int64))
+                maxk = max(topk for _, _, topk, _ in batch)
+                with torch.no_grad(), self.device_config.autocast():
+                    outputs = self.model(inputs)
+                probabilities, indices = outputs.float().softmax(dim=1).topk(maxk, dim=1)
+                probabilities, indices = probabilities.cpu().tolist(), indices.cpu().tolist()
+            except Exception as error:
+                for _, _, _, future in batch:
+                    future.set_exception(error)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.images += len(batch)
+            for (_, _, topk, future), row_indices, row_probabilities in zip(batch, indices, probabilities):
+                future.set_result(list(zip(row_indices[:topk], row_probabilities[:topk])))
+
+    def stats(self):
+        with self._lock:
+            return {'batches': self.batches, 'images': self.images,
+                    'mean_batch_size': self.images / self.batches if self.batches else 0.0,
+                    'queued': self.requests.qsize()}
+
+def load_model(model_path, arch='resnet50', device_config=None, compile=None):
+    model = create_model(arch, num_classes=1000)
+    model.load_state_dict(torch.load(model_path, map_location='cpu'))
+    # Fold BatchNorm into the convs, and the input scaling into conv1 (requests are decoded to uint8)
+    model.eval().fuse_for_inference().fold_input_normalization()
+    return compile_model(device_config.prepare_model(model), compile)
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """POST /predict with an encoded image (JPEG, PNG, ...) as the body; ?topk=N (default 5).
+
+    GET /health answers 200 once the model is loaded; GET /stats reports batching counts.
+    """
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, so the load generator reuses connections
+    batcher = None
+    transform = None
+    max_topk = 1000
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif path == '/stats':
+            self._send_json(200, self.batcher.stats())
+        else:
+            self._send_json(404, {'error': f'Unknown path {path}'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if url.path != '/predict':
+            self._send_json(404, {'error': f'Unknown path {url.path}'})
+            return
+        start = time.perf_counter()
+        try:
+            topk = int(parse_qs(url.query).get('topk', ['5'])[0])
+            if not 1 <= topk <= self.max_topk:
+                raise ValueError(f'topk must be between 1 and {self.max_topk}')
+            # Decoding and preprocessing run on the request thread, in parallel with the model workers
+            image = self.transform(draft_decode(Image.open(io.BytesIO(body)), 256))
+        except Exception as error:
+            self._send_json(400, {'error': str(error)})
+            return
+        try:
+            predictions = self.batcher.submit(image, topk).result()
+        except Exception as error:
+            logging.exception('Inference failed')
+            self._send_json(500, {'error': str(error)})
+            return
+        self._send_json(200, {
+            'predictions': [{'class': index, 'probability': probability} for index, probability in predictions],
+            'latency_ms': 1000 * (time.perf_counter() - start),
+        })
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logging.debug(format, *args)
+
+# Many clients connect at once under load; the default listen backlog of 5 resets some of them
+class BatchingHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)  # stale socket from a previous run
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+def make_server(batcher, host='127.0.0.1', port=8000, unix_socket=None):
+    handler = type('Handler', (PredictionHandler,), {'batcher': batcher, 'transform': eval_transform()})
+    if unix_socket is not None:
+        return UnixHTTPServer(unix_socket, handler)
+    return BatchingHTTPServer((host, port), handler)
+
+def serve(model_path='resnet50_imagenet_model.pth', arch='resnet50', host='127.0.0.1', port=8000, unix_socket=None,
+          max_batch_size=32, max_wait_ms=5.0, num_workers=1, device=None, num_threads=None, amp=None, compile=None):
+    device_config = setup_device(device, num_threads=num_threads, amp=amp)
+    model = load_model(model_path, arch, device_config, compile)
+    batcher = DynamicBatcher(model, device_config, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                             num_workers=num_workers)
+    server = make_server(batcher, host, port, unix_socket)
+    where = unix_socket if unix_socket is not None else f'http://{host}:{server.server_address[1]}'
+    logging.info(f'Serving {arch} from {model_path} on {where} (max batch {max_batch_size}, '
+                 f'max wait {max_wait_ms}ms, {num_workers} workers)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logging.info(f'Batching stats: {batcher.stats()}')
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Dynamic-batching HTTP inference server for ResNet.')
+    parser.add_argument('--model-path', default='resnet50_imagenet_model.pth')
+    parser.add_argument('--arch', default='resnet50', choices=sorted(MODELS))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix-socket', default=None, help='Listen on this Unix socket path instead of TCP')
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0,
+                        help='How long the first request of a batch waits for others to join')
+    parser.add_argument('--num-workers', type=int, default=1, help='Model worker threads running batches')
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--num-threads', type=int, default=None)
+    parser.add_argument('--amp', default=None, choices=['off', 'bf16', 'fp16'])
+    parser.add_argument('--compile', default=None, choices=['off', 'inductor', 'jit'])
+    args = parser.parse_args()
+    serve(args.model_path, args.arch, args.host, args.port, args.unix_socket, args.max_batch_size, args.max_wait_ms,
+          args.num_workers, args.device, args.num_threads, args.amp, args.compile)
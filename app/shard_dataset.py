@@ -0,0 +1,140 @@
+import os
+import bisect
+import json
+import logging
+import argparse
+import numpy as np
+import torch
+import torchvision.transforms as transforms
+from torch.utils.data import Dataset
+from tqdm import tqdm
+from jpeg_draft import draft_loader
+from file_index import IndexedImageFolder
+from models.resnet_model import IMAGENET_MEAN, IMAGENET_STD
+
+INDEX_FILE = 'index.json'
+LABELS_FILE = 'labels.npy'
+SHAPES_FILE = 'shapes.npy'
+OFFSETS_FILE = 'offsets.npy'
+
+# Pack an ImageFolder tree into uint8 shards plus an index (one-time conversion)
+def pack_image_folder(root, out_dir, image_size=256, images_per_shard=4096):
+    # JPEGs are decoded at the smallest DCT scale that still covers the resize
+    folder = IndexedImageFolder(root=root, loader=draft_loader(image_size))
+    # Only the short side is resized; the whole image is kept, so training crops sample from all of it as with
+    # ImageFolder, and CenterCrop(224) reads exactly what Resize(256) + CenterCrop(224) does
+    resize = transforms.Resize(image_size)
+    os.makedirs(out_dir, exist_ok=True)
+
+    num_images = len(folder)
+    shapes = np.zeros((num_images, 2), dtype=np.int32)  # (height, width)
+    offsets = np.zeros(num_images, dtype=np.int64)  # byte offset of each HWC image within its shard
+    shards = []
+    with tqdm(total=num_images, desc=f'Packing {root}') as progress:
+        for shard_idx, start in enumerate(range(0, num_images, images_per_shard)):
+            count = min(images_per_shard, num_images - start)
+            file_name = f'shard-{shard_idx:05d}.u8'
+            offset = 0
+            with open(os.path.join(out_dir, file_name), 'wb') as f:
+                for i in range(start, start + count):
+                    image = np.asarray(resize(folder.loader(folder.path(i))), dtype=np.uint8)
+                    f.write(image.tobytes())
+                    shapes[i] = image.shape[:2]
+                    offsets[i] = offset
+                    offset += image.nbytes
+                    progress.update(1)
+            shards.append({'file': file_name, 'count': count})
+
+    np.save(os.path.join(out_dir, LABELS_FILE), np.asarray(folder.targets, dtype=np.int64))
+    np.save(os.path.join(out_dir, SHAPES_FILE), shapes)
+    np.save(os.path.join(out_dir, OFFSETS_FILE), offsets)
+
+    # The index is written last so a half-written shard directory is never picked up
+    index = {
+        'image_size': image_size,
+        'classes': folder.classes,
+        'class_to_idx': folder.class_to_idx,
+        'shards': shards,
+    }
+    tmp_path = os.path.join(out_dir, INDEX_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(out_dir, INDEX_FILE))
+    logging.info(f'Packed {num_images} images from {root} into {len(shards)} shards in {out_dir}')
+
+class ShardDataset(Dataset):
+    """Reads shards written by `pack_image_folder`.
+
+    Samples are zero-copy CHW uint8 views into the memory map, with the short
+    side at `image_size` and the original aspect ratio, so the transform must
+    work on tensors (see `shard_train_transform` / `shard_eval_transform`).
+    """
+
+    def __init__(self, root, transform=None):
+        self.root = root
+        self.transform = transform
+        with open(os.path.join(root, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.image_size = index['image_size']
+        self.classes = index['classes']
+        self.class_to_idx = index['class_to_idx']
+        self.shard_files = [entry['file'] for entry in index['shards']]
+        self.shard_counts = [entry['count'] for entry in index['shards']]
+        self.shard_starts = np.cumsum([0] + self.shard_counts[:-1]).tolist()
+        self.targets = np.load(os.path.join(root, LABELS_FILE))
+        self.shapes = np.load(os.path.join(root, SHAPES_FILE))
+        self.offsets = np.load(os.path.join(root, OFFSETS_FILE))
+        # Maps are opened lazily so that DataLoader workers each open their own instead of pickling them
+        self._shards = None
+
+    def _open_shards(self):
+        # Copy-on-write mode gives writable views (torch warns on read-only arrays) without copying any pages
+        self._shards = [np.memmap(os.path.join(self.root, file_name), dtype=np.uint8, mode='c')
+                        for file_name in self.shard_files]
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, index):
+        if self._shards is None:
+            self._open_shards()
+        shard_idx = bisect.bisect_right(self.shard_starts, index) - 1
+        height, width = self.shapes[index]
+        offset = self.offsets[index]
+        pixels = self._shards[shard_idx][offset:offset + height * width * 3].reshape(height, width, 3)
+        image = torch.from_numpy(pixels).permute(2, 0, 1)
+        target = int(self.targets[index])
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, target
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shards'] = None
+        return state
+
+# Tensor equivalents of the PIL pipelines in train.py / test_model.py
+# Samples stay uint8 unless normalize=True; the model normalizes uint8 batches itself
+def shard_train_transform(size=224, normalize=False):
+    steps = [transforms.RandomResizedCrop(size, antialias=True), transforms.RandomHorizontalFlip()]
+    if normalize:
+        steps += [transforms.ConvertImageDtype(torch.float32),
+                  transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)]
+    return transforms.Compose(steps)
+
+def shard_eval_transform(size=224, normalize=False):
+    steps = [transforms.CenterCrop(size)]
+    if normalize:
+        steps += [transforms.ConvertImageDtype(torch.float32),
+                  transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)]
+    return transforms.Compose(steps)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Pack an ImageFolder tree into memory-mapped uint8 shards.')
+    parser.add_argument('root', help='ImageFolder directory (e.g. .../imagenet-mini/train)')
+    parser.add_argument('out_dir', help='Directory to write the shards and index to')
+    parser.add_argument('--image-size', type=int, default=256, help='Short side the images are resized to')
+    parser.add_argument('--images-per-shard', type=int, default=4096)
+    args = parser.parse_args()
+    pack_image_folder(args.root, args.out_dir, args.image_size, args.images_per_shard)
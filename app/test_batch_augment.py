@@ -0,0 +1,35 @@
+import torch
+import torchvision.transforms as transforms
+from batch_augment import BatchAugment, sample_crop_boxes
+
+NUM_DRAWS = 4000
+
+# Mean and standard deviation of (top, left, height, width) relative to the image size
+def box_moments(boxes, height, width):
+    top, left, h, w = (torch.as_tensor(v, dtype=torch.float64) for v in boxes)
+    values = torch.stack([top / height, left / width, h / height, w / width])
+    return values.mean(dim=1), values.std(dim=1)
+
+def test_crop_boxes_match_torchvision_distribution():
+    # Landscape, square, and an extreme portrait that often falls back to the centre crop
+    for height, width in ((300, 400), (256, 256), (600, 80)):
+        generator = torch.Generator().manual_seed(0)
+        batched = sample_crop_boxes([height] * NUM_DRAWS, [width] * NUM_DRAWS, generator=generator)
+        top, left, h, w = batched
+        assert (h > 0).all() and (w > 0).all() and (top >= 0).all() and (left >= 0).all()
+        assert (top + h <= height).all() and (left + w <= width).all(), f'{height}x{width}: box outside the image'
+
+        torch.manual_seed(0)
+        image = torch.empty(3, height, width)
+        reference = list(zip(*(transforms.RandomResizedCrop.get_params(image, (0.08, 1.0), (3 / 4, 4 / 3))
+                               for _ in range(NUM_DRAWS))))
+        mean, std = box_moments(batched, height, width)
+        expected_mean, expected_std = box_moments(reference, height, width)
+        assert torch.allclose(mean, expected_mean, atol=0.02), f'{height}x{width}: means {mean} vs {expected_mean}'
+        assert torch.allclose(std, expected_std, atol=0.02), f'{height}x{width}: deviations {std} vs {expected_std}'
+
+def test_batch_augment_output():
+    images = [torch.randint(0, 256, (3, 120 + 10 * i, 160), dtype=torch.uint8) for i in range(4)]
+    out = BatchAugment(64, normalize=False, channels_last=True, generator=torch.Generator().manual_seed(0))(images)
+    assert out.shape == (4, 3, 64, 64) and out.dtype == torch.uint8
+    assert out.is_contiguous(memory_format=torch.channels_last)
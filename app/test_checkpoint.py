@@ -0,0 +1,48 @@
+import os
+import shutil
+import numpy as np
+import torch
+from PIL import Image
+import evaluation
+import file_index
+import train
+from checkpoint import load_checkpoint
+
+# A tiny two-class ImageFolder tree
+def make_image_folder(root, num_classes=2, images_per_class=8):
+    rng = np.random.default_rng(0)
+    for c in range(num_classes):
+        os.makedirs(os.path.join(root, f'n{c:03d}'))
+        for i in range(images_per_class):
+            image = rng.integers(0, 256, (96, 80, 3), dtype=np.uint8)
+            Image.fromarray(image).save(os.path.join(root, f'n{c:03d}', f'{i}.JPEG'))
+
+def run_training(checkpoint_dir, resume_from=None):
+    train.train_model(num_epochs=2, batch_size=4, learning_rate=0.01, num_workers=0, seed=0, device='cpu', amp='off',
+                      arch='resnet18', width_multiplier=0.25, checkpoint_dir=checkpoint_dir, checkpoint_every=2,
+                      keep_checkpoints=100, resume_from=resume_from)
+
+def test_mid_epoch_resume_is_exact(tmp_path, monkeypatch):
+    images = str(tmp_path / 'images')
+    make_image_folder(images)
+    folder = train.IndexedImageFolder
+    monkeypatch.setattr(train, 'IndexedImageFolder', lambda root, **kwargs: folder(images, **kwargs))
+    monkeypatch.setattr(train, 'download_imagenet_data', lambda: None)
+    monkeypatch.setattr(evaluation, 'VAL_DIR', images)
+    monkeypatch.setattr(evaluation, '_val_datasets', {})
+    monkeypatch.setattr(file_index, 'INDEX_DIR', str(tmp_path / 'index'))
+    monkeypatch.chdir(tmp_path)  # the final model is saved to the working directory
+
+    # 4 steps per epoch: resume from step 2 of the first epoch and finish both epochs
+    run_training('uninterrupted')
+    os.makedirs('resumed')
+    shutil.copy(os.path.join('uninterrupted', 'checkpoint-00000002.pt'), 'resumed')
+    run_training('resumed', resume_from='latest')
+
+    expected = load_checkpoint(os.path.join('uninterrupted', 'checkpoint-00000008.pt'))
+    actual = load_checkpoint(os.path.join('resumed', 'checkpoint-00000008.pt'))
+    for name, tensor in expected['model'].items():
+        assert torch.equal(actual['model'][name], tensor), f'{name} differs after resuming'
+    for expected_state, actual_state in zip(expected['optimizer']['state'].values(),
+                                            actual['optimizer']['state'].values()):
+        assert all(torch.equal(actual_state[key], value) for key, value in expected_state.items())
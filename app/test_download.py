@@ -0,0 +1,133 @@
+import io
+import os
+import hashlib
+import zipfile
+import threading
+import contextlib
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import download
+
+FILES = {f'train/n{c:03d}/{i}.JPEG': os.urandom(3000 + 100 * i) for c in range(2) for i in range(4)}
+
+def make_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+ARCHIVE = make_zip(FILES)
+ARCHIVE_SHA256 = hashlib.sha256(ARCHIVE).hexdigest()
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    """Serves `server.data`, honouring Range headers if `server.ranges`; the first `server.truncate` full
+    responses send only half their body before dropping the connection."""
+
+    def do_GET(self):
+        data, start, end = self.server.data, 0, len(self.server.data) - 1
+        range_header = self.headers.get('Range')
+        if range_header and self.server.ranges:
+            first, last = range_header[len('bytes='):].split('-')
+            start, end = int(first), min(int(last) if last else end, end)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            self.send_response(200)
+        body = data[start:end + 1]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.server.requests.append(range_header)
+        if self.server.truncate and not range_header:
+            self.server.truncate -= 1
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@contextlib.contextmanager
+def serve(data=ARCHIVE, ranges=True, truncate=0):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ArchiveHandler)
+    server.data, server.ranges, server.truncate, server.requests = data, ranges, truncate, []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server, f'http://127.0.0.1:{server.server_address[1]}/archive.zip'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(download.time, 'sleep', lambda seconds: None)
+
+def assert_extracted(data_dir):
+    for name, data in FILES.items():
+        assert (Path(data_dir) / name).read_bytes() == data, f'{name} differs'
+    assert download.verify_extracted(data_dir, check_crc=True)
+
+def test_file_url_streams_without_storing_the_archive(tmp_path):
+    archive = tmp_path / 'archive.zip'
+    archive.write_bytes(ARCHIVE)
+    data_dir = tmp_path / 'data'
+    marker = download.fetch_dataset(archive.as_uri(), str(data_dir), num_workers=3)
+    assert_extracted(data_dir)
+    assert not (data_dir / 'archive.zip').exists()
+    assert len(marker['files']) == len(FILES)
+    # A complete dataset is not downloaded again
+    archive.unlink()
+    assert download.fetch_dataset(archive.as_uri(), str(data_dir)) == marker
+
+def test_range_server_streams_members(tmp_path):
+    with serve() as (server, url):
+        download.fetch_dataset(url, str(tmp_path), num_workers=2)
+    assert_extracted(tmp_path)
+    assert not (tmp_path / 'archive.zip').exists()
+    assert all(request is not None for request in server.requests), 'every read should be a Range request'
+
+def test_checksummed_download_from_plain_server(tmp_path):
+    with serve(ranges=False) as (server, url):
+        marker = download.fetch_dataset(url, str(tmp_path), expected_sha256=ARCHIVE_SHA256, num_workers=2)
+    assert_extracted(tmp_path)
+    assert marker['archive_sha256'] == ARCHIVE_SHA256
+    assert not (tmp_path / 'archive.zip').exists()
+
+def test_download_resumes_partial_file(tmp_path):
+    path = str(tmp_path / 'archive.zip')
+    Path(path + '.part').write_bytes(ARCHIVE[:1000])
+    with serve() as (server, url):
+        assert download.download_file(url, path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+    assert server.requests == ['bytes=1000-']
+    assert Path(path).read_bytes() == ARCHIVE
+
+def test_download_restarts_when_ranges_are_ignored(tmp_path):
+    path = str(tmp_path / 'archive.zip')
+    Path(path + '.part').write_bytes(b'x' * 1000)  # discarded: the server answers 200 with the whole file
+    with serve(ranges=False) as (server, url):
+        assert download.download_file(url, path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+    assert Path(path).read_bytes() == ARCHIVE
+
+def test_download_resumes_after_dropped_connection(tmp_path):
+    path = str(tmp_path / 'archive.zip')
+    with serve(truncate=1) as (server, url):
+        assert download.download_file(url, path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+    assert server.requests == [None, f'bytes={len(ARCHIVE) // 2}-']
+    assert Path(path).read_bytes() == ARCHIVE
+
+def test_checksum_mismatch_removes_download(tmp_path):
+    path = str(tmp_path / 'archive.zip')
+    with serve() as (server, url), pytest.raises(IOError, match='Checksum mismatch'):
+        download.download_file(url, path, '0' * 64)
+    assert not os.path.exists(path) and not os.path.exists(path + '.part')
+
+def test_zip_slip_is_refused(tmp_path):
+    archive = tmp_path / 'evil.zip'
+    archive.write_bytes(make_zip({'train/ok.JPEG': b'ok', '../escaped.txt': b'evil'}))
+    data_dir = tmp_path / 'data'
+    with pytest.raises(IOError, match='outside'):
+        download.fetch_dataset(archive.as_uri(), str(data_dir))
+    assert not (tmp_path / 'escaped.txt').exists()
+    assert download.read_marker(str(data_dir)) is None
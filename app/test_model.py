@@ -1,40 +1,24 @@
-import torch
-import torchvision.transforms as transforms
-import torchvision.datasets as datasets
-from torch.utils.data import DataLoader
-from models.resnet_model import ResNet50Model
-
-def test_model_accuracy(model_path='resnet50_imagenet_model.pth'):
-    # Load the model
-    model = ResNet50Model(num_classes=1000)
-    model.load_state_dict(torch.load(model_path))
-    model.eval()  # Set the model to evaluation mode
-
-    # Load test data (replace with your dataset path)
-    transform = transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-    ])
-    test_dataset = datasets.ImageFolder(root='/opt/dlami/nvme/path/to/imagenet/imagenet-mini/val', transform=transform)
-    test_loader = DataLoader(test_dataset, batch_size=32, shuffle=False)
-
-    correct = 0
-    total = 0
-
-    with torch.no_grad():
-        for inputs, labels in test_loader:
-            inputs, labels = inputs.cuda(), labels.cuda()  # Move data to GPU
-            outputs = model(inputs)
-            _, predicted = torch.max(outputs.data, 1)
-            total += labels.size(0)
-            correct += (predicted == labels).sum().item()
-
-    accuracy = 100 * correct / total
+import argparse
+from evaluation import run_evaluation, evaluate_checkpoint
+from models.resnet_model import MODELS
+
+# Defaults for the test cases, overridable from the command line (e.g. --arch resnet18)
+EVAL_SETTINGS = {'model_path': 'resnet50_imagenet_model.pth', 'arch': 'resnet50'}
+
+def test_model_accuracy(model_path=None, **kwargs):
+    settings = dict(EVAL_SETTINGS, **kwargs)
+    if model_path is not None:
+        settings['model_path'] = model_path
+    # The checkpoint is evaluated once; later calls read the cached metrics
+    accuracy = evaluate_checkpoint(**settings).top1
     print(f'Test accuracy: {accuracy:.2f}%')
     return accuracy
 
+# Top-1 accuracy (in %) of an eval-mode model, plus the loader/compute timing split
+def evaluate_accuracy(model, test_loader, device_config):
+    metrics, meter = run_evaluation(model, test_loader, device_config)
+    return metrics.top1, meter
+
 def test_case_1():
     assert test_model_accuracy() > 70, "Test case 1 failed: Accuracy is below 70%"
 
@@ -45,6 +29,15 @@ def test_case_3():
     assert test_model_accuracy() > 80, "Test case 3 failed: Accuracy is below 80%"
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check a trained model against the accuracy thresholds.')
+    parser.add_argument('--arch', default='resnet50', choices=sorted(MODELS))
+    parser.add_argument('--model-path', default=None, help='Default: <arch>_imagenet_model.pth')
+    parser.add_argument('--width-multiplier', type=float, default=1.0)
+    parser.add_argument('--depth-multiplier', type=float, default=1.0)
+    args = parser.parse_args()
+    EVAL_SETTINGS.update(arch=args.arch, model_path=args.model_path or f'{args.arch}_imagenet_model.pth',
+                         width_multiplier=args.width_multiplier, depth_multiplier=args.depth_multiplier)
+
     test_case_1()
     test_case_2()
-    test_case_3() 
\ No newline at end of file
+    test_case_3()
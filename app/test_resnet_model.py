@@ -0,0 +1,57 @@
+import copy
+import torch
+import torch.nn as nn
+from models.resnet_model import IMAGENET_MEAN, IMAGENET_STD, create_model
+from models.quantized_resnet import QuantizableResNet50
+
+# Eval-mode model with non-trivial BatchNorm statistics and affine parameters, so folding has something to fold
+def random_bn_model(arch, seed=0):
+    torch.manual_seed(seed)
+    model = create_model(arch, num_classes=10, width_multiplier=0.25)
+    for module in model.modules():
+        if isinstance(module, nn.BatchNorm2d):
+            module.running_mean.uniform_(-0.5, 0.5)
+            module.running_var.uniform_(0.5, 2.0)
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.uniform_(-0.5, 0.5)
+    return model.eval()
+
+def test_fused_matches_unfused():
+    x = torch.randn(2, 3, 64, 64)
+    for arch in ('resnet18', 'resnet50'):
+        model = random_bn_model(arch)
+        fused = copy.deepcopy(model).fuse_for_inference()
+        assert not any(isinstance(m, nn.BatchNorm2d) for m in fused.modules()), f'{arch}: BatchNorm left after fusing'
+        with torch.no_grad():
+            expected, actual = model(x), fused(x)
+        assert torch.allclose(actual, expected, rtol=1e-4, atol=1e-5), \
+            f'{arch}: fused outputs differ by {(actual - expected).abs().max():.3g}'
+
+def test_uint8_input_matches_normalized_float():
+    model = random_bn_model('resnet18')
+    images = torch.randint(0, 256, (2, 3, 64, 64), dtype=torch.uint8)
+    mean = torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD).view(1, 3, 1, 1)
+    with torch.no_grad():
+        expected = model((images.float() / 255 - mean) / std)
+        actual = model(images)
+        # NHWC-shaped batches are permuted to channels_last NCHW by the model
+        nhwc = model(images.permute(0, 2, 3, 1))
+        folded = copy.deepcopy(model).fuse_for_inference().fold_input_normalization()(images)
+    for name, output in (('uint8', actual), ('uint8 NHWC', nhwc), ('folded uint8', folded)):
+        assert torch.allclose(output, expected, rtol=1e-4, atol=1e-5), \
+            f'{name} outputs differ from normalized float input by {(output - expected).abs().max():.3g}'
+
+def test_quantizable_model_normalizes_once():
+    # With 1/std folded into conv1, a second normalization would rescale the input
+    torch.manual_seed(0)
+    model = QuantizableResNet50(num_classes=10).eval()
+    images = torch.randint(0, 256, (2, 3, 64, 64), dtype=torch.uint8)
+    mean = torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD).view(1, 3, 1, 1)
+    with torch.no_grad():
+        expected = model((images.float() / 255 - mean) / std)
+        model.fold_input_normalization()
+        actual = model(images)
+    assert torch.allclose(actual, expected, rtol=1e-4, atol=1e-5), \
+        f'folded uint8 outputs differ from normalized float input by {(actual - expected).abs().max():.3g}'
@@ -1,128 +1,421 @@
-import os
+import math
+import contextlib
 import torch
 import torch.optim as optim
 import torch.nn as nn
 import torchvision.transforms as transforms
 import torchvision.datasets as datasets
-from torch.utils.data import DataLoader
-from models.resnet_model import ResNet50
+from models.resnet_model import MODELS, create_model
+from models.compile import compile_model
+from shard_dataset import ShardDataset, shard_train_transform
+from data_loading import make_loader, ThroughputMeter, available_cores, default_num_workers
+from device import setup_device
+from val_cache import build_val_cache
+from metrics import MetricAccumulator
+from lr_schedule import linear_scaling_warmup
+from profiling import PhaseTimer, StageProfiler, trace_profiler
+from download import fetch_dataset
+from batch_augment import BatchAugment, pil_to_uint8
+from jpeg_draft import DraftRandomResizedCrop, lazy_loader
+from file_index import IndexedImageFolder
+from evaluation import Evaluator
+from distributed import init_distributed, cleanup_distributed
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data.distributed import DistributedSampler
+from torch.utils.data import RandomSampler
+from checkpoint import (AsyncCheckpointer, ResumableSampler, latest_checkpoint, load_checkpoint, rng_state,
+                        set_rng_state)
 from tqdm import tqdm
 import logging
-import urllib.request
-import zipfile
+import argparse
 from torchsummary import summary  # Import the summary function
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Function to download the ImageNet dataset if it doesn't exist
-def download_imagenet_data(data_dir='/opt/dlami/nvme/path/to/imagenet'):
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
-        logging.info("Downloading ImageNet dataset...")
-        # URL for the ImageNet dataset (this is a placeholder; replace with the actual URL)
-        url = 'https://www.kaggle.com/api/v1/datasets/download/ifigotin/imagenetmini-1000'
-        zip_path = os.path.join(data_dir, 'archive.zip')
+# Function to download the ImageNet dataset if it isn't complete (a partial earlier run is resumed)
+# URL for the ImageNet dataset (this is a placeholder; replace with the actual URL, or a file:// path)
+IMAGENET_URL = 'https://www.kaggle.com/api/v1/datasets/download/ifigotin/imagenetmini-1000'
 
-        # Download the dataset
-        urllib.request.urlretrieve(url, zip_path)
+def download_imagenet_data(data_dir='/opt/dlami/nvme/path/to/imagenet', url=IMAGENET_URL, expected_sha256=None,
+                           num_workers=8):
+    # Completion is recorded by a marker written after extraction, not by the directory existing
+    fetch_dataset(url, data_dir, expected_sha256=expected_sha256, num_workers=num_workers)
 
-        # Extract the dataset
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(data_dir)
+def train_model(num_epochs=100, batch_size=32, learning_rate=0.001, train_shards=None, val_shards=None,
+                num_workers=None, prefetch_factor=2, persistent_workers=True, pin_memory=None, seed=None,
+                device=None, num_threads=None, interop_threads=None, channels_last=None, amp=None,
+                val_cache_dir=None, val_cache_dtype='uint8', log_interval=None, backend=None,
+                checkpoint_dir='checkpoints', checkpoint_every=None, keep_checkpoints=3, resume_from=None,
+                compile=None, arch='resnet50', width_multiplier=1.0, depth_multiplier=1.0,
+                checkpoint_stages=(), accumulation_steps=1, base_batch_size=None, warmup_epochs=5,
+                profile=False, trace_steps=None, trace_dir='traces', augment='batched', jpeg_draft=True):
+    if accumulation_steps < 1:
+        raise ValueError(f'accumulation_steps must be at least 1, got {accumulation_steps}')
+    if checkpoint_stages and compile not in (None, 'off'):
+        # TorchScript skips torch.utils.checkpoint, and dynamo cannot trace the BatchNorm-freezing context_fn
+        # (the graph falls back to eager with errors), so checkpointing only runs uncompiled
+        raise ValueError(f'Activation checkpointing is not supported with compile={compile!r}; use compile=\'off\'')
 
-        logging.info("ImageNet dataset downloaded and extracted.")
-    else:
-        logging.info("ImageNet dataset already exists. Skipping download.")
+    # Under torchrun this joins the process group; otherwise it is a single rank-0 process
+    dist_context = init_distributed(backend)
+
+    # DataLoader settings shared by training and per-epoch evaluation; num_workers=None picks from the core count
+    if num_workers is None:
+        num_workers = default_num_workers(processes=dist_context.local_world_size)
+    loader_settings = dict(num_workers=num_workers, prefetch_factor=prefetch_factor,
+                           persistent_workers=persistent_workers, pin_memory=pin_memory, seed=seed)
+
+    # Pick the device; on CPU leave the cores used by loader workers to the data pipeline
+    if num_threads is None:
+        num_threads = max(1, available_cores() // dist_context.local_world_size - num_workers)
+    if device is None and dist_context.enabled and torch.cuda.is_available():
+        device = f'cuda:{dist_context.local_rank}'
+        torch.cuda.set_device(dist_context.local_rank)
+    device_config = setup_device(device, num_threads=num_threads, interop_threads=interop_threads,
+                                 channels_last=channels_last, amp=amp)
 
-def train_model(num_epochs=100, batch_size=32, learning_rate=0.001):
-    # Check and download the ImageNet dataset
-    download_imagenet_data()
+    # Batches stay uint8 end to end and the model normalizes them (a quarter of the bytes of float32);
+    # augment='batched': crop/flip run per batch in the collate function instead of per sample
+    if augment not in ('batched', 'per-image'):
+        raise ValueError(f"Unknown augment mode {augment!r}; expected 'batched' or 'per-image'")
+    batched = augment == 'batched'
+    # jpeg_draft: ImageFolder samples pick their crop from the JPEG header and decode at a reduced DCT scale
+    draft_crops = jpeg_draft and train_shards is None
+    batch_augment = None
+    if batched:
+        batch_augment = BatchAugment(224, normalize=False, channels_last=device_config.channels_last,
+                                     crop=not draft_crops)
+
+    if train_shards is not None:
+        # Pre-decoded shards from shard_dataset.py, no JPEG decoding per epoch
+        train_dataset = ShardDataset(train_shards, transform=None if batched else shard_train_transform())
+    else:
+        # Check and download the ImageNet dataset (once per node, the other ranks wait for it)
+        if dist_context.local_rank == 0:
+            download_imagenet_data()
+        dist_context.barrier()
 
-    # Data augmentation and normalization for training
-    transform = transforms.Compose([
-        transforms.RandomResizedCrop(224),
-        transforms.RandomHorizontalFlip(),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-    ])
+        # Data augmentation for training (normalization happens in the model)
+        loader = datasets.folder.default_loader
+        if draft_crops:
+            loader = lazy_loader
+            if batched:
+                # The crop happens at decode time; BatchAugment only resizes and flips
+                transform = transforms.Compose([DraftRandomResizedCrop(224, resize=False), pil_to_uint8])
+            else:
+                transform = transforms.Compose([
+                    DraftRandomResizedCrop(224),
+                    transforms.RandomHorizontalFlip(),
+                    transforms.PILToTensor(),
+                ])
+        elif batched:
+            transform = pil_to_uint8
+        else:
+            transform = transforms.Compose([
+                transforms.RandomResizedCrop(224),
+                transforms.RandomHorizontalFlip(),
+                transforms.PILToTensor(),
+            ])
 
-    # Load the ImageNet dataset (replace with your dataset path)
-    train_dataset = datasets.ImageFolder(root='/opt/dlami/nvme/path/to/imagenet/imagenet-mini/train', transform=transform)
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
+        # Load the ImageNet dataset (replace with your dataset path); the directory is only walked when its
+        # cached file index (file_index.py) is missing or stale
+        train_dataset = IndexedImageFolder(root='/opt/dlami/nvme/path/to/imagenet/imagenet-mini/train', transform=transform,
+                                           loader=loader)
+    # The shuffle order is reproducible from a saved state so a resumed run continues mid-epoch
+    sampler_generator = None
+    if dist_context.enabled:
+        # Each rank trains on its own 1/world_size slice, reshuffled every epoch via set_epoch
+        train_sampler = DistributedSampler(train_dataset, num_replicas=dist_context.world_size,
+                                           rank=dist_context.rank, shuffle=True, seed=seed or 0)
+        loader_settings['seed'] = None if seed is None else seed + dist_context.rank
+    else:
+        sampler_generator = torch.Generator()
+        # Unseeded runs draw the shuffle seed from the global generator rather than reseeding it (torch.seed()),
+        # so a caller's torch.manual_seed still fixes the weight init below
+        sampler_generator.manual_seed(seed if seed is not None else int(torch.empty((), dtype=torch.int64).random_()))
+        train_sampler = RandomSampler(train_dataset, generator=sampler_generator)
+    resumable_sampler = ResumableSampler(train_sampler)
+    # With channels_last the collate function writes batches straight into NHWC memory, so inputs are never converted
+    augment_kwargs = {'collate_fn': batch_augment.collate} if batch_augment is not None else {}
+    train_loader = make_loader(train_dataset, batch_size=batch_size, sampler=resumable_sampler,
+                               channels_last=device_config.channels_last, **augment_kwargs, **loader_settings)
+    logging.info(f'Training DataLoader: {train_loader.num_workers} workers, pin_memory={train_loader.pin_memory}')
 
     # Initialize the model, loss function, and optimizer
-    model = ResNet50(num_classes=1000).to('cuda')  # Create the model, added cuda
-    logging.info("Model Summary:")  # Log the model summary
-    summary(model, (3, 224, 224))  # Assuming input size is (3, 224, 224)
-    
+    # checkpoint_stages recomputes those stages' activations in backward instead of storing them
+    model = device_config.prepare_model(create_model(arch, num_classes=1000, width_multiplier=width_multiplier,
+                                                     depth_multiplier=depth_multiplier,
+                                                     checkpoint_stages=checkpoint_stages))
+    if dist_context.is_main:
+        logging.info("Model Summary:")  # Log the model summary
+        summary(model, (3, 224, 224), device=device_config.device.type)  # Assuming input size is (3, 224, 224)
+
+    # The unwrapped model is what gets evaluated and saved, so checkpoints keep the usual keys
+    eval_model = model
+    model = compile_model(model, compile)  # Shares parameters with eval_model
+    if dist_context.enabled:
+        device_ids = [device_config.device.index] if device_config.device.type == 'cuda' else None
+        model = DistributedDataParallel(model, device_ids=device_ids)
+
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.Adam(model.parameters(), lr=learning_rate)
+    scaler = device_config.grad_scaler()  # No-op unless amp='fp16'
+
+    # Gradients of accumulation_steps batches on every rank make up one optimizer update; learning_rate is
+    # the rate for base_batch_size (default: one batch), scaled linearly to the effective batch after warmup
+    effective_batch_size = batch_size * accumulation_steps * dist_context.world_size
+    updates_per_epoch = math.ceil(len(train_loader) / accumulation_steps)
+    scheduler = linear_scaling_warmup(optimizer, base_batch_size or batch_size, effective_batch_size,
+                                      warmup_steps=int(warmup_epochs * updates_per_epoch))
+
+    # Preprocess the val set once; every per-epoch evaluation then streams from the memory map
+    val_cache = None
+    if val_cache_dir is not None and dist_context.is_main:
+        val_cache = build_val_cache(val_cache_dir, val_shards=val_shards, dtype=val_cache_dtype, num_workers=num_workers)
+    # One evaluator for the whole run: its val dataset, loader and (persistent) worker pool serve every epoch
+    evaluator = None
+    if dist_context.is_main:
+        evaluator = Evaluator(device_config, val_shards=val_shards, val_cache=val_cache, profile=profile,
+                              **dict(loader_settings, persistent_workers=True))
 
-    # Training loop
-    for epoch in range(num_epochs):
+    # With compilation on, the first steps are reported separately from steady-state throughput
+    meter = ThroughputMeter(warmup_steps=2 if compile not in (None, 'off') else 0)
+    stats = MetricAccumulator(device_config.device)
+    checkpointer = AsyncCheckpointer(checkpoint_dir, keep_last=keep_checkpoints) if dist_context.is_main else None
+
+    # profile: per-phase step timers and per-stage forward hooks (both synchronize the device);
+    # trace_steps=(start, count): torch.profiler Chrome trace of those steps, counted from the start of this run
+    timer = PhaseTimer(device_config.device, enabled=profile)
+    stage_profiler = None
+    if profile:
+        if compile in (None, 'off'):
+            stage_profiler = StageProfiler(eval_model, device_config.device)
+        else:
+            logging.warning('Per-stage forward hooks need an eager model; skipping them with compile enabled')
+    profiler = None
+    if trace_steps is not None:
+        profiler = trace_profiler(trace_dir, *trace_steps, device=device_config.device)
+        profiler.start()
+
+    # Resume model, optimizer, RNG and data position from a checkpoint ('latest' picks the newest in checkpoint_dir).
+    # A seeded run with num_workers=0 resumes bit-identically; loader workers start with fresh RNG streams after a
+    # restart, so with workers the augmentation draws (not the data order) differ from an uninterrupted run
+    start_epoch, start_step, global_step, resume_state = 0, 0, 0, None
+    if resume_from == 'latest':
+        resume_from = latest_checkpoint(checkpoint_dir)
+    if resume_from is not None:
+        resume_state = load_checkpoint(resume_from)
+        eval_model.load_state_dict(resume_state['model'])
+        optimizer.load_state_dict(resume_state['optimizer'])
+        scaler.load_state_dict(resume_state['scaler'])
+        if resume_state.get('scheduler') is not None:
+            scheduler.load_state_dict(resume_state['scheduler'])
+        # Each rank continues its own RNG streams (augmentation draws, worker base seeds)
+        rng_states = resume_state['rng']
+        if len(rng_states) == dist_context.world_size:
+            set_rng_state(rng_states[dist_context.rank])
+        else:
+            logging.warning(f'{resume_from} was saved by {len(rng_states)} ranks, not {dist_context.world_size}; '
+                            f'RNG streams start afresh')
+            torch.seed()
+        start_epoch, start_step, global_step = resume_state['epoch'], resume_state['step'], resume_state['global_step']
+        logging.info(f'Resumed from {resume_from} at epoch {start_epoch + 1}, step {start_step}')
+
+    # sampler_state / loader_state are the shuffle and loader seed generator states at the start of `epoch`;
+    # stats are only kept mid-epoch. Every rank must call this, since the RNG states are gathered from all of them
+    def save_checkpoint(epoch, step, sampler_state, loader_state):
+        rng_states = dist_context.gather(rng_state())
+        if checkpointer is None:
+            return
+        checkpointer.save({
+            'model': eval_model.state_dict(),
+            'optimizer': optimizer.state_dict(),
+            'scaler': scaler.state_dict(),
+            'scheduler': scheduler.state_dict(),
+            'epoch': epoch,
+            'step': step,
+            'global_step': global_step,
+            'rng': rng_states,
+            'sampler_state': sampler_state,
+            'loader_state': loader_state,
+            'stats': stats.state_dict() if step else None,
+        }, global_step)
+
+    # Training loop; statistics stay on the device and are only read every log_interval steps and at epoch end.
+    # step and global_step count batches; mid-epoch checkpoints are only taken after an optimizer update
+    last_checkpoint_step = global_step
+    for epoch in range(start_epoch, num_epochs):
         model.train()  # Set the model to training mode
-        running_loss = 0.0
-        correct = 0
-        total = 0
+        stats.reset()
+        meter.reset()
+        timer.reset()
+        if stage_profiler is not None:
+            stage_profiler.reset()
+        device_config.reset_peak_memory()
+        if dist_context.enabled:
+            train_sampler.set_epoch(epoch)
+        if resume_state is not None and epoch == start_epoch:
+            # Replay this epoch's shuffle and skip the batches that were already trained on
+            if sampler_generator is not None and resume_state['sampler_state'] is not None:
+                sampler_generator.set_state(resume_state['sampler_state'])
+            # With a seed, the loader draws worker base seeds from its own generator rather than the global RNG
+            if train_loader.generator is not None and resume_state['loader_state'] is not None:
+                train_loader.generator.set_state(resume_state['loader_state'])
+            resumable_sampler.skip = start_step * batch_size
+            if resume_state['stats'] is not None:
+                stats.load_state_dict(resume_state['stats'])
+        epoch_sampler_state = sampler_generator.get_state() if sampler_generator is not None else None
+        epoch_loader_state = train_loader.generator.get_state() if train_loader.generator is not None else None
+        step = start_step if epoch == start_epoch else 0
+        steps_in_epoch = step + len(train_loader)
+
+        progress = tqdm(train_loader, desc=f'Epoch {epoch + 1}/{num_epochs}', disable=not dist_context.is_main)
+        for inputs, labels in timer.track(meter.track(progress)):
+            with timer.phase('h2d'):
+                inputs, labels = device_config.to_device(inputs, labels)
 
-        for inputs, labels in tqdm(train_loader, desc=f'Epoch {epoch + 1}/{num_epochs}'):
-            inputs, labels = inputs.to('cuda'), labels.to('cuda') # Move data to GPU, added cuda
+            # The epoch's last update may accumulate fewer batches
+            group_start = step - step % accumulation_steps
+            group_size = min(accumulation_steps, steps_in_epoch - group_start)
+            is_update = step + 1 == group_start + group_size
 
-            # Zero the parameter gradients
-            optimizer.zero_grad()
+            # Zero the parameter gradients at the start of each accumulation group
+            if step == group_start:
+                optimizer.zero_grad(set_to_none=True)
 
-            # Forward pass
-            outputs = model(inputs)
-            loss = criterion(outputs, labels)
+            # Gradients are only all-reduced on the batch that completes the group
+            sync_context = model.no_sync() if dist_context.enabled and not is_update else contextlib.nullcontext()
+            with sync_context:
+                # Forward pass
+                with timer.phase('forward'), device_config.autocast():
+                    outputs = model(inputs)
+                    loss = criterion(outputs, labels)
 
-            # Backward pass and optimization
-            loss.backward()
-            optimizer.step()
+                # Backward pass; the accumulated gradient is the mean over the group's batches
+                with timer.phase('backward'):
+                    scaler.scale(loss / group_size).backward()
+
+            # Optimization
+            if is_update:
+                with timer.phase('optimizer'):
+                    scaler.step(optimizer)
+                    scaler.update()
+                    scheduler.step()
 
             # Statistics
-            running_loss += loss.item()
-            _, predicted = torch.max(outputs.data, 1)
-            total += labels.size(0)
-            correct += (predicted == labels).sum().item()
+            stats.update(outputs, labels, loss)
+            if log_interval and stats.steps % log_interval == 0:
+                progress.set_postfix(loss=f'{stats.loss:.4f}', accuracy=f'{stats.accuracy:.2f}%')
+
+            step += 1
+            global_step += 1
+            # The epoch's last batch is covered by the end-of-epoch checkpoint below
+            if (checkpoint_every and is_update and step < steps_in_epoch
+                    and global_step - last_checkpoint_step >= checkpoint_every):
+                save_checkpoint(epoch, step, epoch_sampler_state, epoch_loader_state)
+                last_checkpoint_step = global_step
+            if profiler is not None:
+                profiler.step()
+
+        # Checkpoint the finished epoch before anything else can fail
+        save_checkpoint(epoch + 1, 0, sampler_generator.get_state() if sampler_generator is not None else None,
+                        train_loader.generator.get_state() if train_loader.generator is not None else None)
+        last_checkpoint_step = global_step
 
-        # Log the epoch loss and accuracy
-        epoch_loss = running_loss / len(train_loader)
-        epoch_accuracy = 100 * correct / total
-        logging.info(f'Epoch [{epoch + 1}/{num_epochs}], Loss: {epoch_loss:.4f}, Accuracy: {epoch_accuracy:.2f}%')
+        # Log the epoch loss and accuracy (summed over all ranks)
+        stats.all_reduce()
+        epoch_loss = stats.loss
+        epoch_accuracy = stats.accuracy
+        logging.info(f'Epoch [{epoch + 1}/{num_epochs}], Loss: {epoch_loss:.4f}, Accuracy: {epoch_accuracy:.2f}%, '
+                     f'LR: {scheduler.get_last_lr()[0]:.6g}')
+        meter.report(f'Epoch [{epoch + 1}/{num_epochs}] training throughput (amp={device_config.amp})')
+        logging.info(f'Epoch [{epoch + 1}/{num_epochs}] peak memory: {device_config.peak_memory() / 2**20:.0f} MiB')
+        timer.report(f'Epoch [{epoch + 1}/{num_epochs}] training phases')
+        if stage_profiler is not None:
+            stage_profiler.report(f'Epoch [{epoch + 1}/{num_epochs}] training forward')
 
         # Test the model after each epoch
-        test_model(model)
+        if evaluator is not None:
+            evaluator.evaluate(eval_model)
+
+    if profiler is not None:
+        profiler.stop()
+    if stage_profiler is not None:
+        stage_profiler.remove()
 
     # Save the trained model
-    torch.save(model.state_dict(), 'resnet50_imagenet_model.pth')
-
-def test_model(model):
-    # Load the model
-    model.eval()  # Set the model to evaluation mode
-
-    # Load test data (replace with your dataset path)
-    transform = transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-    ])
-    test_dataset = datasets.ImageFolder(root='/opt/dlami/nvme/path/to/imagenet/imagenet-mini/val', transform=transform)
-    test_loader = DataLoader(test_dataset, batch_size=32, shuffle=False)
-
-    correct = 0
-    total = 0
-
-    with torch.no_grad():
-        for inputs, labels in test_loader:
-            inputs, labels = inputs.to('cuda'), labels.to('cuda')  # Move data to GPU, added cuda
-            outputs = model(inputs)
-            _, predicted = torch.max(outputs.data, 1)
-            total += labels.size(0)
-            correct += (predicted == labels).sum().item()
-
-    print(f'Test accuracy after epoch: {100 * correct / total:.2f}%')
+    if dist_context.is_main:
+        checkpointer.wait()
+        torch.save(eval_model.state_dict(), f'{arch}_imagenet_model.pth')
+    cleanup_distributed(dist_context)
+
+# One-off evaluation; train_model keeps a single Evaluator for all epochs instead
+def test_model(model, val_shards=None, device_config=None, num_workers=None, prefetch_factor=2, persistent_workers=False,
+               pin_memory=None, seed=None, val_cache=None, test_dataset=None, profile=False):
+    if device_config is None:
+        device_config = setup_device(next(model.parameters()).device)
+    evaluator = Evaluator(device_config, val_shards=val_shards, val_cache=val_cache, dataset=test_dataset,
+                          num_workers=num_workers, prefetch_factor=prefetch_factor,
+                          persistent_workers=persistent_workers, pin_memory=pin_memory, seed=seed, profile=profile)
+    return evaluator.evaluate(model)
 
 if __name__ == "__main__":
-    train_model() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Train a ResNet on ImageNet.')
+    parser.add_argument('--arch', default='resnet50', choices=sorted(MODELS))
+    parser.add_argument('--width-multiplier', type=float, default=1.0)
+    parser.add_argument('--depth-multiplier', type=float, default=1.0)
+    parser.add_argument('--checkpoint-stages', default='', type=lambda value: [s for s in value.split(',') if s],
+                        help='Comma-separated stages to recompute in backward (activation checkpointing), '
+                             'e.g. layer1,layer2')
+    parser.add_argument('--epochs', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--lr', type=float, default=0.001, help='Learning rate for --base-batch-size')
+    parser.add_argument('--accumulation-steps', type=int, default=1,
+                        help='Batches per optimizer update (effective batch = batch size x steps x ranks)')
+    parser.add_argument('--base-batch-size', type=int, default=None,
+                        help='Batch size --lr is tuned for; it is scaled linearly to the effective batch '
+                             '(default: --batch-size)')
+    parser.add_argument('--warmup-epochs', type=float, default=5, help='Epochs to ramp up to the scaled LR')
+    parser.add_argument('--train-shards', default=None, help='Shard directory from shard_dataset.py')
+    parser.add_argument('--val-shards', default=None, help='Shard directory from shard_dataset.py')
+    parser.add_argument('--val-cache-dir', default=None, help='Directory for the preprocessed val cache')
+    parser.add_argument('--num-workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--device', default=None, help='cpu, cuda, cuda:1, ... (default: cuda if available)')
+    parser.add_argument('--num-threads', type=int, default=None)
+    parser.add_argument('--memory-format', default=None, choices=['channels_last', 'contiguous'],
+                        help='Model and batch layout (default: channels_last on CPU, contiguous on accelerators)')
+    parser.add_argument('--amp', default=None, choices=['off', 'bf16', 'fp16'],
+                        help='Autocast dtype (default: bf16 on CPUs with native bf16, otherwise off)')
+    parser.add_argument('--log-interval', type=int, default=None)
+    parser.add_argument('--checkpoint-dir', default='checkpoints')
+    parser.add_argument('--checkpoint-every', type=int, default=None, help='Also checkpoint every N steps')
+    parser.add_argument('--keep-checkpoints', type=int, default=3)
+    parser.add_argument('--resume-from', default=None, help="Checkpoint path, or 'latest'")
+    parser.add_argument('--compile', default=None, choices=['off', 'inductor', 'jit'],
+                        help='Compiled execution: torch.compile (inductor) or TorchScript (jit)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Log per-phase step times and per-stage forward time/activation size')
+    parser.add_argument('--trace-steps', nargs=2, type=int, default=None, metavar=('START', 'COUNT'),
+                        help='Write a torch.profiler Chrome trace of COUNT steps starting at step START')
+    parser.add_argument('--trace-dir', default='traces')
+    parser.add_argument('--augment', default='batched', choices=['batched', 'per-image'],
+                        help='Training augmentation on whole uint8 batches, or the per-image transforms')
+    parser.add_argument('--no-jpeg-draft', dest='jpeg_draft', action='store_false',
+                        help='Decode training JPEGs at full resolution instead of the reduced DCT scale the crop needs')
+    parser.add_argument('--backend', default=None, choices=['gloo', 'nccl'],
+                        help='Process group backend under torchrun (default: nccl with CUDA, else gloo)')
+    args = parser.parse_args()
+    train_model(num_epochs=args.epochs, batch_size=args.batch_size, learning_rate=args.lr,
+                train_shards=args.train_shards, val_shards=args.val_shards, val_cache_dir=args.val_cache_dir,
+                num_workers=args.num_workers, seed=args.seed, device=args.device, num_threads=args.num_threads,
+                amp=args.amp, channels_last=None if args.memory_format is None else args.memory_format == 'channels_last',
+                log_interval=args.log_interval, backend=args.backend,
+                checkpoint_dir=args.checkpoint_dir, checkpoint_every=args.checkpoint_every,
+                keep_checkpoints=args.keep_checkpoints, resume_from=args.resume_from, compile=args.compile,
+                arch=args.arch, width_multiplier=args.width_multiplier, depth_multiplier=args.depth_multiplier,
+                checkpoint_stages=args.checkpoint_stages, accumulation_steps=args.accumulation_steps,
+                base_batch_size=args.base_batch_size, warmup_epochs=args.warmup_epochs,
+                profile=args.profile, trace_steps=args.trace_steps, trace_dir=args.trace_dir,
+                augment=args.augment, jpeg_draft=args.jpeg_draft)
@@ -0,0 +1,112 @@
+import os
+import json
+import logging
+import numpy as np
+import torch
+from torchvision.datasets.folder import find_classes
+from tqdm import tqdm
+from shard_dataset import ShardDataset, INDEX_FILE, shard_eval_transform
+from data_loading import make_loader
+from evaluation import VAL_DIR, eval_transform
+from jpeg_draft import draft_loader
+from file_index import IndexedImageFolder, tree_mtimes
+from models.resnet_model import IMAGENET_MEAN, IMAGENET_STD
+
+META_FILE = 'meta.json'
+IMAGES_FILE = 'images.bin'
+LABELS_FILE = 'labels.npy'
+
+class ValCache:
+    """Preprocessed val set as a memory-mapped array, iterated in batches like a DataLoader.
+
+    uint8 caches hold the Resize(256)+CenterCrop(224) pixels (lossless) and are
+    yielded as uint8 for the model to normalize; float16 caches hold the
+    normalized tensors directly.
+    Images are stored NHWC, so batches come out as channels_last NCHW views.
+    """
+
+    def __init__(self, cache_dir, batch_size=32):
+        self.cache_dir = cache_dir
+        self.batch_size = batch_size
+        with open(os.path.join(cache_dir, META_FILE)) as f:
+            meta = json.load(f)
+        self.dtype = meta['dtype']
+        self.classes = meta['classes']
+        self.num_images = meta['num_images']
+        # Copy-on-write so torch gets writable views without copying pages
+        self.images = np.memmap(os.path.join(cache_dir, IMAGES_FILE), dtype=self.dtype, mode='c',
+                                shape=(self.num_images, meta['image_size'], meta['image_size'], 3))
+        self.labels = torch.from_numpy(np.load(os.path.join(cache_dir, LABELS_FILE)))
+
+    def __len__(self):
+        return (self.num_images + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        for start in range(0, self.num_images, self.batch_size):
+            batch = torch.from_numpy(self.images[start:start + self.batch_size]).permute(0, 3, 1, 2)
+            if self.dtype != 'uint8':
+                batch = batch.float()
+            yield batch, self.labels[start:start + self.batch_size]
+
+# What a cache was built from: the source directory and its mtimes (index.json for shards, the class
+# directories for an ImageFolder tree), so added, removed or repacked images invalidate it
+def source_signature(val_shards=None):
+    if val_shards is not None:
+        return {'source': os.path.realpath(val_shards),
+                'source_mtimes': [os.stat(os.path.join(val_shards, INDEX_FILE)).st_mtime_ns]}
+    return {'source': os.path.realpath(VAL_DIR),
+            'source_mtimes': tree_mtimes(VAL_DIR, find_classes(VAL_DIR)[0])}
+
+def build_val_cache(cache_dir, val_shards=None, dtype='uint8', image_size=224, num_workers=None, batch_size=32):
+    """Materialize the preprocessed val set once; returns the existing cache if it matches the request.
+
+    A cache built with another dtype, image size or source, or from a val set
+    that has changed since, is rebuilt.
+    """
+    if dtype not in ('uint8', 'float16'):
+        raise ValueError(f'Unsupported val cache dtype: {dtype}')
+    if val_shards is not None:
+        dataset = ShardDataset(val_shards, transform=shard_eval_transform(image_size))
+    else:
+        dataset = IndexedImageFolder(root=VAL_DIR, transform=eval_transform(image_size), loader=draft_loader(256))
+    expected = dict(source_signature(val_shards), dtype=dtype, image_size=image_size, num_images=len(dataset))
+
+    meta_path = os.path.join(cache_dir, META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if all(meta.get(key) == value for key, value in expected.items()):
+            return ValCache(cache_dir, batch_size=batch_size)
+        logging.info(f'Val cache in {cache_dir} does not match the requested val set; rebuilding it')
+        # Until the new metadata is written, the half-rewritten cache must not be picked up
+        os.remove(meta_path)
+    # channels_last batches are already NHWC in memory, so writing them to the cache is a plain copy
+    loader = make_loader(dataset, batch_size=64, shuffle=False, num_workers=num_workers,
+                         persistent_workers=False, pin_memory=False, channels_last=True)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    num_images = len(dataset)
+    images = np.memmap(os.path.join(cache_dir, IMAGES_FILE), dtype=dtype, mode='w+',
+                       shape=(num_images, image_size, image_size, 3))
+    mean = torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD).view(1, 3, 1, 1)
+    labels = []
+    start = 0
+    for batch, batch_labels in tqdm(loader, desc=f'Building val cache in {cache_dir}'):
+        if dtype == 'float16':
+            batch = batch.float().div_(255).sub_(mean).div_(std).half()
+        images[start:start + len(batch)] = batch.permute(0, 2, 3, 1).numpy()
+        labels.append(batch_labels)
+        start += len(batch)
+    images.flush()
+    del images
+    np.save(os.path.join(cache_dir, LABELS_FILE), torch.cat(labels).numpy())
+
+    # A cache only counts as built once meta.json exists; it was removed above, so a build cut short starts over
+    meta = dict(expected, classes=dataset.classes)
+    tmp_path = os.path.join(cache_dir, META_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(cache_dir, META_FILE))
+    logging.info(f'Cached {num_images} preprocessed val images ({dtype}) in {cache_dir}')
+    return ValCache(cache_dir, batch_size=batch_size)